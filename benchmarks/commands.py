@@ -0,0 +1,356 @@
+"""
+This file is a part of the source code for the PygameCommunityBot.
+This project has been licensed under the MIT license.
+Copyright (c) 2020-present PygameCommunityDiscord
+
+Benchmark of the command argument parser and the argument casting layer. It
+runs without a Discord connection, commands are invoked by lightweight fake
+Message, Member, Channel and Guild objects. For every case, it reports the
+number of operations per second, and the memory allocated by one operation.
+Before that, it checks that member arguments resolve when the gateway fails.
+Run it from the root of the repository with "python benchmarks/commands.py",
+optionally with the names of the cases to run as arguments
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import os
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, Optional, Union
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# the bot reads its token at import time, but it never connects here
+os.environ.setdefault("TOKEN", "benchmark")
+
+import discord  # noqa: E402
+import pygame  # noqa: E402
+
+from pgbot import db  # noqa: E402
+from pgbot.commands.base import ArgError, BaseCommand, get_command_params  # noqa: E402
+from pgbot.commands.parser import (  # noqa: E402
+    CodeBlock,
+    String,
+    parse_args,
+    split_args,
+)
+
+GUILD_ID = 772505616680878080
+CHANNEL_ID = 772507247540437032
+MEMBER_IDS = range(10**17, 10**17 + 100)
+
+
+class FakeMember:
+    """
+    A member of the fake guild
+    """
+
+    def __init__(self, member_id: int):
+        self.id = member_id
+        self.name = self.display_name = f"member{member_id % 1000}"
+        self.mention = f"<@!{member_id}>"
+        self.bot = False
+        self.roles = []
+
+
+class FakeMessage:
+    """
+    A message, with just the attributes that commands use
+    """
+
+    def __init__(
+        self,
+        content: str,
+        author: Optional[FakeMember] = None,
+        channel: Optional[FakeChannel] = None,
+        guild: Optional[FakeGuild] = None,
+        message_id: int = 1,
+    ):
+        self.id = message_id
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = guild
+        self.attachments = []
+        self.reference = None
+
+    async def edit(self, **kwargs):
+        pass
+
+    async def delete(self):
+        pass
+
+
+class FakeChannel:
+    """
+    A text channel, that has every message that is fetched from it
+    """
+
+    def __init__(self, channel_id: int, guild: FakeGuild):
+        self.id = channel_id
+        self.name = f"channel{channel_id % 1000}"
+        self.mention = f"<#{channel_id}>"
+        self.guild = guild
+
+    async def fetch_message(self, message_id: int):
+        return FakeMessage("", channel=self, guild=self.guild, message_id=message_id)
+
+    def get_partial_message(self, message_id: int):
+        return FakeMessage("", channel=self, guild=self.guild, message_id=message_id)
+
+    async def send(self, *args, **kwargs):
+        return FakeMessage("", channel=self, guild=self.guild)
+
+
+class FakeGuild:
+    """
+    A guild, with members, roles and channels looked up from dicts
+    """
+
+    def __init__(self):
+        self.id = GUILD_ID
+        self.filesize_limit = 8 * 1024 * 1024
+        self.members = {i: FakeMember(i) for i in MEMBER_IDS}
+        self.roles = {i: discord.Object(i) for i in MEMBER_IDS}
+        self.channels = {CHANNEL_ID: FakeChannel(CHANNEL_ID, self)}
+
+    def get_member(self, member_id: int):
+        return self.members.get(member_id)
+
+    def get_role(self, role_id: int):
+        return self.roles.get(role_id)
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
+
+    async def fetch_member(self, member_id: int):
+        return self.members[member_id]
+
+
+class FakeResponse:
+    """
+    An HTTP response, that discord.py errors are made from
+    """
+
+    def __init__(self, status: int):
+        self.status = status
+        self.reason = "fake"
+
+
+class FailingQueryGuild(FakeGuild):
+    """
+    A guild with no members in its cache, whose gateway member queries fail
+    """
+
+    def get_member(self, member_id: int):
+        return None
+
+    async def query_members(self, **kwargs):
+        raise discord.HTTPException(FakeResponse(500), "member query failed")
+
+    async def fetch_member(self, member_id: int):
+        if member_id not in self.members:
+            raise discord.NotFound(FakeResponse(404), "Unknown Member")
+        return self.members[member_id]
+
+
+class BenchCommand(BaseCommand):
+    """
+    Commands with the kinds of parameters that the bot commands have
+    """
+
+    async def cmd_plain(self, name: str, count: int, flag: bool = False):
+        pass
+
+    async def cmd_mixed(
+        self,
+        member: discord.Member,
+        pos: tuple[int, ...],
+        *words: Union[str, String],
+        color: Optional[pygame.Color] = None,
+        when: Optional[datetime.datetime] = None,
+        scale: float = 1.0,
+    ):
+        pass
+
+    async def cmd_nested(self, data: tuple[tuple[int, int], ...], **kwargs: int):
+        pass
+
+    async def cmd_deep(self, data: tuple):
+        pass
+
+    async def cmd_code(self, msg: discord.PartialMessage, code: CodeBlock):
+        pass
+
+
+# every case runs on this loop, creating a loop per operation would be timed too
+LOOP = asyncio.new_event_loop()
+
+GUILD = FakeGuild()
+AUTHOR = GUILD.members[MEMBER_IDS[0]]
+CHANNEL = GUILD.channels[CHANNEL_ID]
+
+
+def make_command(content: str):
+    msg = FakeMessage(content, AUTHOR, CHANNEL, GUILD)
+    return BenchCommand(msg, FakeMessage("Loading...", channel=CHANNEL, guild=GUILD))
+
+
+CODE = "import pygame\n\nfor i in range(10):\n    print(f'{i}: \"{i * 2}\"')\n" * 500
+ESCAPES = "\\n\\t\\x41\\u00e9\\U0001F600\\'" * 500
+
+# realistic and pathological command strings
+COMMANDS = {
+    "short": "pg!plain hello 42 flag=true",
+    "mixed": (
+        f"pg!mixed <@!{MEMBER_IDS[1]}> (1, 2, 3) a 'b c' \"d\" e "
+        "color=#ff8800 when='2021-06-01T12:00:00Z' scale=2.5"
+    ),
+    "deep tuples": "pg!deep " + "(" * 500 + "1" + ")" * 500,
+    "nested tuples": "pg!nested (" + "(1, 2) " * 500 + ")",
+    "many kwargs": "pg!nested () " + " ".join(f"k{i}={i}" for i in range(500)),
+    "long code block": f"pg!code 1234 ```py\n{CODE}```",
+    "escape heavy": f"pg!mixed {MEMBER_IDS[2]} 1 '{ESCAPES}'",
+}
+
+
+def parse_case(content: str):
+    cmd_str = content[len("pg!") :]
+    return lambda: parse_args(cmd_str)
+
+
+def split_case(content: str):
+    cmd_str = content[len("pg!") :]
+    return lambda: list(split_args(cmd_str))
+
+
+def cast_case(content: str):
+    """
+    Cast the parsed args and kwargs of a command, without calling it
+    """
+    cmd, args, kwargs = parse_args(content[len("pg!") :])
+    command = make_command(content)
+
+    positional = []
+    named = {}
+    var_pos = var_kw = None
+    for param in get_command_params(command.cmds_and_funcs[cmd]):
+        kind = param.param.kind
+        if kind == param.param.VAR_POSITIONAL:
+            var_pos = param
+        elif kind == param.param.VAR_KEYWORD:
+            var_kw = param
+        else:
+            named[param.name] = param
+            if kind != param.param.KEYWORD_ONLY:
+                positional.append(param)
+
+    pairs = list(zip(positional, args))
+    pairs.extend((var_pos, arg) for arg in args[len(positional) :])
+    pairs.extend((named.get(key, var_kw), arg) for key, arg in kwargs.items())
+
+    async def cast():
+        for param, arg in pairs:
+            await command.cast_arg(param, arg, cmd)
+
+    return lambda: LOOP.run_until_complete(cast())
+
+
+def call_case(content: str):
+    """
+    Parse, cast and call a command, like the bot does
+    """
+
+    async def call():
+        await make_command(content).call_cmd()
+
+    return lambda: LOOP.run_until_complete(call())
+
+
+def check_member_resolver():
+    """
+    Check that member arguments are fetched over REST when the gateway member
+    query fails, and that members that do not exist then fail with ArgError
+    """
+    guild = FailingQueryGuild()
+    channel = FakeChannel(CHANNEL_ID, guild)
+    param = get_command_params(BenchCommand.cmd_mixed)[0]
+
+    async def cast(member_id: int):
+        command = BenchCommand(
+            FakeMessage("", AUTHOR, channel, guild),
+            FakeMessage("Loading...", channel=channel, guild=guild),
+        )
+        # a member that is never resolved would make this hang
+        return await asyncio.wait_for(
+            command.cast_arg(param, str(member_id), "mixed", "member"), 5
+        )
+
+    assert LOOP.run_until_complete(cast(MEMBER_IDS[1])) is guild.members[MEMBER_IDS[1]]
+    try:
+        LOOP.run_until_complete(cast(1))
+    except ArgError:
+        pass
+    else:
+        raise AssertionError("casting a member that does not exist did not fail")
+
+    print("member arguments resolve when the gateway member query fails")
+
+
+def escape_case(string: str):
+    return lambda: String(string)
+
+
+CASES: dict[str, Callable[[], Callable[[], Any]]] = {
+    "escape: escape heavy": lambda: escape_case(ESCAPES),
+    "escape: plain": lambda: escape_case("no escapes at all " * 200),
+}
+for _name, _content in COMMANDS.items():
+    CASES[f"split_args: {_name}"] = lambda c=_content: split_case(c)
+    CASES[f"parse_args: {_name}"] = lambda c=_content: parse_case(c)
+    CASES[f"cast_arg: {_name}"] = lambda c=_content: cast_case(c)
+    CASES[f"call_cmd: {_name}"] = lambda c=_content: call_case(c)
+
+
+def measure(func: Callable[[], Any]):
+    """
+    Get the operations per second of a function, and the peak memory that is
+    allocated while it runs once
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(3, number)) / number
+
+    tracemalloc.start()
+    func()
+    tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return 1 / best, peak - start
+
+
+def main():
+    names = sys.argv[1:]
+    print(f"{'case':<32} {'ops/sec':>12} {'alloc (KiB)':>12}")
+    for name, case in CASES.items():
+        if names and not any(i in name for i in names):
+            continue
+
+        ops, alloc = measure(case())
+        print(f"{name:<32} {ops:>12.1f} {alloc / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    # the command calls look up the blacklist in the DB, which lives in memory
+    LOOP.run_until_complete(db.init(db.MemoryBackend()))
+    try:
+        check_member_resolver()
+        main()
+    finally:
+        LOOP.run_until_complete(db.quit())
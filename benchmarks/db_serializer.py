@@ -0,0 +1,112 @@
+"""
+This file is a part of the source code for the PygameCommunityBot.
+This project has been licensed under the MIT license.
+Copyright (c) 2020-present PygameCommunityDiscord
+
+Benchmark of the typed DB serializer against pickle, on payloads shaped like
+the reminders, feature, emotions and clock DB tables. Run it from the root of
+the repository with "python benchmarks/db_serializer.py"
+"""
+
+import datetime
+import importlib.util
+import os
+import pickle
+import random
+import timeit
+
+# load the serializer module by its path, so that the bot (and the env vars it
+# needs) is not imported
+spec = importlib.util.spec_from_file_location(
+    "serializer",
+    os.path.join(os.path.dirname(__file__), "..", "pgbot", "serializer.py"),
+)
+serializer = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(serializer)
+
+random.seed(0)
+
+
+def member_id():
+    return random.randrange(10**17, 10**18)
+
+
+def make_reminders(members: int = 500):
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    return {
+        member_id(): {
+            now
+            + datetime.timedelta(minutes=random.randrange(10**6)): (
+                "do the thing " * random.randrange(1, 10),
+                member_id(),
+                member_id(),
+            )
+            for _ in range(random.randrange(1, 10))
+        }
+        for _ in range(members)
+    }
+
+
+def make_feature(channels: int = 200):
+    return {
+        name: {member_id(): random.random() < 0.5 for _ in range(channels)}
+        for name in ("nocode", "spam", "bonk", "dadjoke")
+    }
+
+
+def make_emotions():
+    return {
+        "happy": 42,
+        "anger": 13,
+        "bored": 100,
+        "confused": 0,
+        "exhausted": 7,
+    }
+
+
+def make_clock(members: int = 300):
+    return {
+        member_id(): (random.randrange(-48, 48) / 4, random.randrange(0xFFFFFF))
+        for _ in range(members)
+    }
+
+
+PAYLOADS = {
+    "reminders": make_reminders(),
+    "feature": make_feature(),
+    "emotions": make_emotions(),
+    "clock": make_clock(),
+}
+
+SERIALIZERS = {
+    "pickle": (pickle.dumps, pickle.loads),
+    "typed": (serializer.dumps, serializer.loads),
+}
+
+
+def bench(func, arg):
+    """
+    Time func(arg) in microseconds, taking the best of a few repeats
+    """
+    timer = timeit.Timer(lambda: func(arg))
+    number, _ = timer.autorange()
+    return min(timer.repeat(5, number)) / number * 1_000_000
+
+
+def main():
+    print(
+        f"{'table':<10} {'serializer':<10} {'size (B)':>10} "
+        f"{'dumps (us)':>12} {'loads (us)':>12}"
+    )
+    for name, payload in PAYLOADS.items():
+        for ser_name, (dumps, loads) in SERIALIZERS.items():
+            data = dumps(payload)
+            assert loads(data) == payload
+            print(
+                f"{name:<10} {ser_name:<10} {len(data):>10} "
+                f"{bench(dumps, payload):>12.1f} {bench(loads, data):>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+This file is a part of the source code for the PygameCommunityBot.
+This project has been licensed under the MIT license.
+Copyright (c) 2020-present PygameCommunityDiscord
+
+Property based fuzzer for the command argument parser. It checks that
+parse_args, on any input:
+- returns a command name, a list of args and a dict of kwargs made only of
+  the types that the parser produces, or raises a BotException
+- finishes in time, and takes time linear in the length of the input, for
+  families of inputs that grow in the ways that stress the parser
+Run it from the root of the repository with "python benchmarks/fuzz_parser.py",
+optionally with the number of random inputs and a seed as arguments
+"""
+
+import importlib.util
+import os
+import random
+import sys
+import time
+
+# load the parser module by its path, so that the bot (and the env vars it
+# needs) is not imported
+spec = importlib.util.spec_from_file_location(
+    "parser",
+    os.path.join(os.path.dirname(__file__), "..", "pgbot", "commands", "parser.py"),
+)
+parser = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(parser)
+
+# the longest time that parsing one random input may take, in seconds
+MAX_PARSE_TIME = 0.05
+
+# when the size of an input is multiplied by SCALE, the time it takes to parse
+# may at most be multiplied by SCALE * MAX_SLOWDOWN. Linear parsing stays
+# around 1, quadratic parsing gets close to SCALE
+SCALE = 8
+MAX_SLOWDOWN = 2.5
+
+# pieces that random inputs are made of, weighted towards the characters that
+# change the state of the parser
+ATOMS = [
+    " ", " ", " ", "\n", "\t", ",", "=", " =", "(", ")", ")(", "=(",
+    "'", '"', "`", "'''", '"""', "```", "\\", "\\'", '\\"', "\\`",
+    "\\n", "\\x4", "\\x41", "\\u00e9", "\\U0001F600", "\\UFFFFFFFF", "\\q",
+    "a", "word", "key", "1", "-2.5", "_", "é", "🙂", "py\n",
+]  # fmt: skip
+
+
+def random_input(rng: random.Random):
+    """
+    Make a random command string out of a few atoms
+    """
+    return "".join(rng.choice(ATOMS) for _ in range(rng.randrange(1, 30)))
+
+
+def check_arg(arg):
+    """
+    Check that an argument is one of the types that the parser produces. This
+    does not recurse, because tuples can be nested very deeply
+    """
+    stack = [arg]
+    while stack:
+        arg = stack.pop()
+        if isinstance(arg, tuple):
+            stack.extend(arg)
+        elif not isinstance(arg, (str, parser.String, parser.CodeBlock)):
+            raise AssertionError(f"parser produced an arg of type {type(arg)}")
+
+
+def parse(cmd_str: str):
+    """
+    Parse a command string, checking the properties of the result. Returns the
+    time it took
+    """
+    start = time.perf_counter()
+    try:
+        cmd, args, kwargs = parser.parse_args(cmd_str)
+    except parser.BotException:
+        return time.perf_counter() - start
+    except Exception as exc:
+        raise AssertionError(f"parser raised {exc!r} on {cmd_str!r}") from exc
+
+    elapsed = time.perf_counter() - start
+    assert isinstance(cmd, str), cmd_str
+    for arg in args:
+        check_arg(arg)
+    for key, arg in kwargs.items():
+        assert isinstance(key, str) and key[:1].isalpha(), cmd_str
+        check_arg(arg)
+
+    return elapsed
+
+
+# families of inputs, that grow with n in the ways that stress the parser
+FAMILIES = {
+    "deep tuples": lambda n: "cmd " + "(" * n + "1" + ")" * n,
+    "spaced deep tuples": lambda n: "cmd " + "( " * n + "1" + " )" * n,
+    "wide tuple": lambda n: "cmd (" + "1, " * n + ")",
+    "many tuples": lambda n: "cmd " + "(1)(2)" * n,
+    "long code block": lambda n: "cmd ```py\n" + "print('x')\n" * n + "```",
+    "many kwargs": lambda n: "cmd " + " ".join(f"k{i}={i}" for i in range(n)),
+    "many args": lambda n: "cmd " + "a " * n,
+    "many strings": lambda n: "cmd " + "'a' " * n,
+    "escape heavy string": lambda n: "cmd '" + "\\n\\t\\x41\\u00e9\\'" * n + "'",
+    "escaped quotes": lambda n: "cmd " + "\\'" * n,
+    "unclosed string": lambda n: "cmd 'a" + " b" * n,
+    "unclosed multiline": lambda n: "cmd '''" + "a\n" * n,
+    "almost closed multiline": lambda n: "cmd '''" + "a''" * n,
+    "quote soup": lambda n: "cmd " + "'\"`" * n,
+}
+
+
+def best_time(cmd_str: str, repeat: int = 5):
+    return min(parse(cmd_str) for _ in range(repeat))
+
+
+def check_scaling(base: int = 500):
+    """
+    Check that no family of inputs takes superlinear time to parse
+    """
+    for name, family in FAMILIES.items():
+        small = best_time(family(base))
+        large = best_time(family(base * SCALE))
+        slowdown = large / max(small, 1e-7) / SCALE
+        print(
+            f"{name:<24} {large * 1000:8.2f} ms for n={base * SCALE:<6} {slowdown:.2f}"
+        )
+        assert slowdown < MAX_SLOWDOWN, f"parsing {name} is superlinear"
+
+
+def fuzz(count: int, seed: int):
+    """
+    Parse random inputs, checking the properties of the results
+    """
+    rng = random.Random(seed)
+    for _ in range(count):
+        cmd_str = random_input(rng)
+        elapsed = parse(cmd_str)
+        assert elapsed < MAX_PARSE_TIME, f"parsing {cmd_str!r} took {elapsed:.3f}s"
+
+    print(f"parsed {count} random inputs (seed {seed}) without errors")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else random.randrange(2**32)
+    fuzz(count, seed)
+    check_scaling()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+"""
+This file is a part of the source code for the PygameCommunityBot.
+This project has been licensed under the MIT license.
+Copyright (c) 2020-present PygameCommunityDiscord
+
+Differential test and benchmark of the command argument parser against the old
+character by character implementation. Every input of a fixed corpus and of a
+random one is split and parsed by both, and their outputs (or errors) must be
+the same.
+Run it from the root of the repository with "python benchmarks/parser.py"
+"""
+
+import importlib.util
+import os
+import random
+import timeit
+from typing import Any, Optional
+
+# load the parser module by its path, so that the bot (and the env vars it
+# needs) is not imported
+spec = importlib.util.spec_from_file_location(
+    "parser",
+    os.path.join(os.path.dirname(__file__), "..", "pgbot", "commands", "parser.py"),
+)
+parser = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(parser)
+
+ArgError = parser.ArgError
+BotException = parser.BotException
+CodeBlock = parser.CodeBlock
+KwargError = parser.KwargError
+
+random.seed(0)
+
+
+class String(parser.String):
+    """
+    String, with the old escape implementation that builds the result one
+    character at a time
+    """
+
+    def escape(self, string: str):
+        cnt = 0
+        newstr = ""
+        while cnt < len(string):
+            char = string[cnt]
+            cnt += 1
+            if char == "\\":
+                char = string[cnt]
+                cnt += 1
+                if char.lower() in ["x", "u"]:
+                    if char.lower() == "x":
+                        n = 2
+                    else:
+                        n = 4 if char == "u" else 8
+
+                    var = string[cnt : cnt + n]
+                    try:
+                        if len(var) != n:
+                            n = len(var)
+                            raise ValueError()
+
+                        newstr += chr(int(var, base=16))
+                    except (ValueError, OverflowError):
+                        esc = string[cnt - 2 : cnt + n]
+                        raise BotException(
+                            "Invalid escape character",
+                            f"Invalid unicode escape: `{esc}` in string",
+                        )
+                    cnt += n
+
+                elif char in parser.ESCAPES:
+                    newstr += parser.ESCAPES[char]
+                else:
+                    raise BotException(
+                        "Invalid escape character",
+                        f"Unknown escape `\\{char}`",
+                    )
+            else:
+                newstr += char
+
+        return newstr
+
+
+OLD_SPLIT_FLAGS = (("`", CodeBlock), ('"', String), ("'", String))
+
+
+# kept as it was, as the reference that the new parser is checked against
+def old_split_args(split_str: str):  # noqa: C901
+    """
+    The old split_args, that checks every split flag on every character
+    """
+    split_state = -1
+    is_multiline = False
+    prev = 0
+
+    for cnt, char in enumerate(split_str):
+        if prev > cnt:
+            continue
+
+        for state, (matchchar, splitfunc) in enumerate(OLD_SPLIT_FLAGS):
+            if split_state != -1 and state != split_state:
+                continue
+
+            if char == "\n" and split_state != -1 and not is_multiline:
+                raise BotException(
+                    f"Invalid {splitfunc.__name__} formatting!",
+                    "Use triple quotes/ticks for multiline blocks",
+                )
+
+            if char == matchchar:
+                if cnt and split_str[cnt - 1] == "\\":
+                    break
+
+                old_multiline = is_multiline
+                is_multiline = split_str[cnt + 1 : cnt + 3] == 2 * matchchar
+
+                if split_state != -1:
+                    if is_multiline and not old_multiline:
+                        is_multiline = False
+
+                    elif old_multiline and not is_multiline:
+                        is_multiline = True
+                        continue
+
+                ret = split_str[prev:cnt]
+                if split_state == -1:
+                    split_state = state
+                    if ret:
+                        yield ret
+
+                else:
+                    split_state = -1
+                    yield splitfunc(ret)
+
+                prev = cnt + 1
+                if is_multiline:
+                    prev += 2
+
+                break
+
+    if split_state != -1:
+        name = parser.SPLIT_FLAGS[split_state][1].__name__
+        raise BotException(
+            f"Invalid {name}!",
+            f"The {name.lower()} was not properly closed",
+        )
+
+    ret = split_str[prev:]
+    if ret:
+        yield ret
+
+
+# kept as it was, as the reference that the new parser is checked against
+def old_parse_args(cmd_str: str):  # noqa: C901
+    """
+    The old parse_args, that walks nested lists to find the innermost tuple
+    """
+    args: list[Any] = []
+    kwargs: dict[str, Any] = {}
+    temp_list: Optional[list[Any]] = None  # used to store the temporary tuple
+
+    kwstart = False  # used to make sure that keyword args come after args
+    prevkey = None  # temporarily store previous key name
+
+    def append_arg(arg: Any):
+        """
+        Internal helper funtion to append a parsed argument into arg/kwarg/tuple
+        """
+        nonlocal prevkey
+        if temp_list is not None:
+            # already in a tuple, flush arg into that
+            temp = temp_list
+            while temp and isinstance(temp[-1], list):
+                temp = temp[-1]
+
+            temp.append(arg)
+        else:
+            if prevkey is not None:
+                # had a keyword, flush arg into keyword
+                kwargs[prevkey] = arg
+                prevkey = None
+            else:
+                if kwstart:
+                    raise KwargError(
+                        "Keyword arguments cannot come before positional arguments"
+                    )
+                args.append(arg)
+
+    for arg in old_split_args(cmd_str):
+        if not isinstance(arg, str):
+            append_arg(arg)
+            continue
+
+        # these string replacements are done to make parsing easier
+        # ignore any commas in the source string, just treat them as spaces
+        for a, b in (
+            (" =", "="),
+            (",", " "),
+            (")(", ") ("),
+            ("=(", "= ("),
+        ):
+            arg = arg.replace(a, b)
+
+        for substr in arg.split():
+            if not substr:
+                continue
+
+            splits = substr.split("=")
+            if len(splits) == 2:
+                # got first keyword, mark a flag so that future arguments are
+                # all keywords
+                kwstart = True
+                if temp_list is not None:
+                    # we were parsing a tuple, and got keyword arg
+                    raise KwargError("Keyword arguments cannot come inside a tuple")
+
+                # underscores not allowed at start of keyword names here
+                if not splits[0][0].isalpha():
+                    raise KwargError("Keyword argument must begin with an alphabet")
+
+                if prevkey:
+                    # we had a prevkey, and also got a new keyword in the
+                    # same iteration
+                    raise KwargError("Did not specify argument after '='")
+
+                prevkey = splits[0]
+                if not prevkey:
+                    # we do not have keyword name
+                    raise KwargError("Missing keyword before '=' symbol")
+
+                if splits[1]:
+                    # flush kwarg
+                    kwargs[prevkey] = splits[1]
+                    prevkey = None
+
+            elif len(splits) == 1:
+                # current substring is not a keyword (does not have =)
+                while substr.startswith("("):
+                    # start of a tuple
+                    if temp_list is not None:
+                        temp = temp_list
+                        while temp and isinstance(temp[-1], list):
+                            temp = temp[-1]
+
+                        temp.append([])
+                    else:
+                        temp_list = []
+
+                    substr = substr[1:]
+                    if not substr:
+                        continue
+
+                oldlen = len(substr)
+                substr = substr.rstrip(")")
+                count = oldlen - len(substr)
+                if substr:
+                    append_arg(substr)
+
+                for _ in range(count):
+                    # end of a tuple
+                    if temp_list is None:
+                        raise ArgError("Invalid closing tuple bracket")
+
+                    prevtemp = None
+                    temp = temp_list
+                    while temp and isinstance(temp[-1], list):
+                        prevtemp = temp
+                        temp = temp[-1]
+
+                    if prevtemp is None:
+                        arg = tuple(temp)
+                        temp_list = None
+                        append_arg(arg)
+                    else:
+                        prevtemp[-1] = tuple(temp)
+            else:
+                raise KwargError("Invalid number of '=' in keyword argument expression")
+
+    if temp_list is not None:
+        raise ArgError("Tuple was not closed")
+
+    if prevkey:
+        raise KwargError("Did not specify argument after '='")
+
+    # user entered something like 'pg!', display help message
+    if not args:
+        if kwargs:
+            raise BotException("Invalid Command name!", "Command name must be str")
+        args = ["help"]
+
+    cmd = args.pop(0)
+    if not isinstance(cmd, str):
+        raise BotException("Invalid Command name!", "Command name must be str")
+
+    return cmd, args, kwargs
+
+
+def normalize(arg):
+    """
+    Get a comparable version of the output of the parser
+    """
+    if isinstance(arg, (tuple, list)):
+        return tuple(map(normalize, arg))
+    if isinstance(arg, dict):
+        return {key: normalize(value) for key, value in arg.items()}
+    if isinstance(arg, parser.String):
+        return "String", arg.string
+    if isinstance(arg, CodeBlock):
+        return "CodeBlock", arg.lang, arg.code
+    return arg
+
+
+def outcome(func, arg):
+    """
+    Get a comparable result of calling func on arg, including any error
+    """
+    try:
+        return normalize(func(arg))
+    except Exception as exc:
+        return type(exc).__name__, exc.args
+
+
+CORPUS = [
+    "",
+    "pg!help",
+    "pg!test_parser 1 'a' x=2",
+    "pg!emsudo \"hi\" ```py\nprint('hi')\n```",
+    'pg!exec ```py\nfor i in range(10):\n    print(f"{i}")```',
+    'pg!say "unclosed',
+    "pg!say 'new\nline'",
+    "pg!say '''multi\nline''' after",
+    'pg!say """x"" y""" z',
+    "pg!say 'escaped \\' quote'",
+    "pg!say \\'not a string\\'",
+    "pg!say '\\x41\\u0042\\U00000043\\n\\t\\\\'",
+    "pg!say '\\q'",
+    "pg!say '\\x4'",
+    "pg!say '\\UFFFFFFFF'",
+    "pg!say '''''' '' \"\" ``",
+    "pg!say ''''",
+    "pg!say '''a''''",
+    "pg!cmd a=(1, 2)(3 4) b =(5,6) c  =7 d,=8",
+    "pg!cmd ((1,(2)), 3)) ,,, )()() =(",
+]
+
+
+def random_input(length: int):
+    """
+    Make a random command, out of the characters that the parser cares about
+    """
+    chars = "ab \n\\`\"'=,()xuU0n"
+    return "".join(random.choice(chars) for _ in range(length))
+
+
+def large_inputs():
+    code = "def f(x, y=2):\n    return x * y  # 'quoted' \"text\"\n" * 1000
+    text = "word, (1, 2) key=value 'a \\n string' " * 1000
+    string = "escaped \\t text " * 2000
+    return {
+        "code block": f"pg!exec ```py\n{code}```",
+        "long string": f'pg!say "{string}"',
+        "plain args": f"pg!cmd {text}",
+        "tuple args": "pg!cmd " + "(1, (2, 'a')) word " * 1000 + "key=value",
+    }
+
+
+# the old parse_args crashed with an IndexError on keyword arguments without a
+# name (like "=x"), the new one raises this error instead
+MISSING_KEYWORD = ("KwargError", ("Missing keyword before '=' symbol",))
+
+
+def check():
+    inputs = CORPUS + [random_input(random.randrange(1, 40)) for _ in range(100_000)]
+    inputs.extend(large_inputs().values())
+    changed = 0
+    for arg in inputs:
+        old = outcome(lambda s: tuple(old_split_args(s)), arg)
+        new = outcome(lambda s: tuple(parser.split_args(s)), arg)
+        assert old == new, (arg, old, new)
+
+        old = outcome(old_parse_args, arg)
+        new = outcome(parser.parse_args, arg)
+        if old[0] == "IndexError" and new == MISSING_KEYWORD:
+            changed += 1
+            continue
+
+        assert old == new, (arg, old, new)
+
+    print(
+        f"parser output matches the old implementation on {len(inputs)} inputs,",
+        f"except for {changed} keyword argument(s) without a name",
+    )
+
+
+def main():
+    check()
+
+    for name, arg in large_inputs().items():
+        for impl, func in (
+            ("old split_args", lambda arg=arg: list(old_split_args(arg))),
+            ("new split_args", lambda arg=arg: list(parser.split_args(arg))),
+            # some inputs are invalid commands, so errors are caught too
+            ("old parse_args", lambda arg=arg: outcome(old_parse_args, arg)),
+            ("new parse_args", lambda arg=arg: outcome(parser.parse_args, arg)),
+        ):
+            best = min(timeit.repeat(func, number=5, repeat=5)) / 5
+            print(f"{name:<12} {len(arg):>7} chars  {impl}  {best * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+This file is a part of the source code for the PygameCommunityBot.
+This project has been licensed under the MIT license.
+Copyright (c) 2020-present PygameCommunityDiscord
+
+Benchmark of the message trigger matcher against the old way of checking
+bonks and dad jokes, on a synthetic chat corpus. It also checks that the
+matcher finds the same triggers as the old checks. Run it from the root of the
+repository with "python benchmarks/triggers.py"
+"""
+
+import importlib.util
+import os
+import random
+import timeit
+
+import unidecode
+
+# load the triggers module by its path, so that the bot (and the env vars it
+# needs) is not imported
+spec = importlib.util.spec_from_file_location(
+    "triggers",
+    os.path.join(os.path.dirname(__file__), "..", "pgbot", "utils", "triggers.py"),
+)
+triggers = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(triggers)
+
+BONK = "<:pg_bonk:780423317718302781>"
+random.seed(0)
+
+CHAT = [
+    "hey, does anyone know how to rotate a sprite around its center?",
+    "use pygame.transform.rotate and then get_rect(center=old_center)",
+    "thanks!",
+    "lol",
+    "I'm working on a platformer, the collision is driving me crazy",
+    "i am so tired today",
+    "can you share your code? put it in a code block",
+    "```py\nimport pygame\npygame.init()\nscreen = pygame.display.set_mode((800, "
+    "600))\n```",
+    "i am not sure. maybe",
+    "I am  Bob, the builder",
+    "Iam here",
+    "wait i'm lost, i am Bob",
+    "Café ouvert, je suis là",
+    "I’m back",
+    "ok",
+    f"{BONK}",
+    f"{BONK} {BONK} {BONK} stop that",
+    "why is my game running at 10 fps when I blit 10000 surfaces every frame? "
+    "I thought pygame was supposed to be fast but apparently not, help pls",
+    "Привет всем",
+    "i'm",
+    "nice showcase! what did you use for the particles?",
+]
+
+
+def make_corpus(size: int = 5000):
+    # most messages are unique, like in a real chat
+    return [
+        f"{random.choice(CHAT)} {i}" if i % 3 else random.choice(CHAT)
+        for i in range(size)
+    ]
+
+
+def old_classify(content: str):
+    """
+    The old checks of check_bonk and dad_joke, without the discord calls
+    """
+    bonks = 0
+    if BONK in content:
+        bonks = content.count(BONK)
+        bonks = content.count(BONK)
+
+    dad_joke_only = False
+    name = None
+    lowered = unidecode.unidecode(content.lower().strip())
+    for trigger in ("i am", "i'm"):
+        if lowered == trigger:
+            dad_joke_only = True
+            break
+
+        if trigger in lowered and len(lowered) < 60:
+            ind = lowered.index(trigger)
+            if ind and not content[ind - 1].isspace():
+                break
+
+            name = content[ind + len(trigger) :]
+            if not name or not name[0].isspace():
+                name = None
+                break
+
+            name = name.strip()
+            for char in (",", "\n", "."):
+                if char in name:
+                    name = name.split(char)[0]
+            break
+
+    return bonks, dad_joke_only, name or None
+
+
+def main():
+    corpus = make_corpus()
+    matcher = triggers.TriggerMatcher(BONK)
+
+    # the old checks took the name from the message with the offsets of the
+    # folded text, so they are only compared on ASCII messages
+    for content in corpus:
+        if content.isascii():
+            new = matcher._classify(content)
+            assert old_classify(content) == (
+                new.bonks,
+                new.dad_joke_only,
+                new.dad_joke_name,
+            ), content
+
+    def run_old():
+        for content in corpus:
+            old_classify(content)
+
+    def run_new():
+        for content in corpus:
+            matcher._classify(content)
+
+    def run_new_cached():
+        # a message goes through several stages, each of them classifies it
+        matcher.classify.cache_clear()
+        for content in corpus:
+            matcher.classify(content)
+            matcher.classify(content)
+
+    for name, func in (
+        ("old checks", run_old),
+        ("matcher", run_new),
+        ("matcher, classified twice (cached)", run_new_cached),
+    ):
+        best = min(timeit.repeat(func, number=5, repeat=5)) / 5
+        print(f"{name:<36} {best / len(corpus) * 1_000_000:8.2f} us/message")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ import discord
 
 import pgbot
 from pgbot.common import bot
+from pgbot.utils import message_cache
 
 
 @bot.event
@@ -39,11 +40,40 @@ async def on_member_leave(member: discord.Member):
     await pgbot.clean_db_member(member)
 
 
+@bot.event
+async def on_guild_channel_create(channel: discord.abc.GuildChannel):
+    """
+    This function is called for every channel created in a guild
+    """
+    pgbot.channel_update(None, channel)
+
+
+@bot.event
+async def on_guild_channel_update(
+    before: discord.abc.GuildChannel, after: discord.abc.GuildChannel
+):
+    """
+    This function is called for every channel edited in a guild
+    """
+    pgbot.channel_update(before, after)
+
+
+@bot.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    """
+    This function is called for every channel deleted in a guild
+    """
+    pgbot.channel_update(channel, None)
+
+
 @bot.event
 async def on_message(msg: discord.Message):
     """
     This function is called for every message by user.
     """
+    # messages of bots (including this one) are cached too, commands often
+    # refer to them
+    message_cache.add(msg)
     if msg.author.bot:
         return
 
@@ -63,22 +93,76 @@ async def on_message_edit(old: discord.Message, new: discord.Message):
     """
     This function is called for every message edited by user.
     """
+    message_cache.add(new)
     if new.author.bot:
         return
 
     await pgbot.message_edit(old, new)
 
 
+@bot.event
+async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+    """
+    This function is called for every message deleted, even if it is not cached
+    """
+    message_cache.remove(payload.message_id)
+
+
+@bot.event
+async def on_raw_bulk_message_delete(payload: discord.RawBulkMessageDeleteEvent):
+    """
+    This function is called for every bulk delete of messages
+    """
+    for msg_id in payload.message_ids:
+        message_cache.remove(msg_id)
+
+
+@bot.event
+async def on_raw_message_edit(payload: discord.RawMessageUpdateEvent):
+    """
+    This function is called for every message edited, even if it is not cached.
+    It runs before on_message_edit, which caches the edited message if its new
+    state is known
+    """
+    message_cache.remove(payload.message_id)
+
+
 @bot.event
 async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
     """
     This function is called for every reaction added by user.
     """
+    # the reactions of a cached message may be outdated now
+    message_cache.remove(payload.message_id)
     if payload.member is None or payload.member.bot:
         return
 
     await pgbot.raw_reaction_add(payload)
 
 
+@bot.event
+async def on_raw_reaction_remove(payload: discord.RawReactionActionEvent):
+    """
+    This function is called for every reaction removed
+    """
+    message_cache.remove(payload.message_id)
+
+
+@bot.event
+async def on_raw_reaction_clear(payload: discord.RawReactionClearEvent):
+    """
+    This function is called for every message that has all reactions cleared
+    """
+    message_cache.remove(payload.message_id)
+
+
+@bot.event
+async def on_raw_reaction_clear_emoji(payload: discord.RawReactionClearEmojiEvent):
+    """
+    This function is called for every message that has a reaction cleared
+    """
+    message_cache.remove(payload.message_id)
+
+
 if __name__ == "__main__":
     pgbot.run()
@@ -12,12 +12,17 @@ import os
 import random
 import signal
 import sys
+import time
+from typing import Any, Awaitable, Callable, Optional
 
 import discord
 import pygame
 
 from pgbot import commands, common, db, emotion, routine
-from pgbot.utils import embed_utils, utils
+from pgbot.commands import command_log
+from pgbot.commands.utils import sandbox
+from pgbot.utils import cmd_logs, embed_utils, utils
+from pgbot.utils.stats import Histogram
 
 
 async def _init():
@@ -48,7 +53,6 @@ async def _init():
         for channel in server.channels:
             if channel.id == common.ServerConstants.DB_CHANNEL_ID:
                 common.db_channel = channel
-                await db.init()
             elif channel.id == common.ServerConstants.LOG_CHANNEL_ID:
                 common.log_channel = channel
             elif channel.id == common.ServerConstants.ARRIVALS_CHANNEL_ID:
@@ -67,6 +71,12 @@ async def _init():
                 if channel.id == value:
                     common.entry_channels[key] = channel
 
+    await db.init()
+    await emotion.init()
+    await utils.load_channel_features()
+    command_log.init()
+    sandbox.init()
+
 
 async def init():
     """
@@ -146,35 +156,46 @@ async def member_join(member: discord.Member):
                 + f"{common.roles_channel.mention}{end}"
             )
             # new member joined, yaayyy, snek is happi
-            await emotion.update("happy", 20)
+            emotion.update("happy", 20)
             return
 
 
+def channel_update(
+    before: Optional[discord.abc.GuildChannel],
+    after: Optional[discord.abc.GuildChannel],
+):
+    """
+    Handle a channel being created, updated or deleted
+    """
+    if (
+        before is None
+        or after is None
+        or getattr(before, "category_id", None) != getattr(after, "category_id", None)
+    ):
+        # channel features that are set on categories apply to other channels now
+        utils.invalidate_channel_features()
+
+
 async def clean_db_member(member: discord.Member):
     """
     This function silently removes users from database messages
     """
-    for table_name in ("stream", "reminders", "clock"):
+    for table_name in ("reminders", "clock"):
         async with db.DiscordDB(table_name) as db_obj:
-            data = db_obj.get({})
-            if member.id in data:
-                data.pop(member)
-                db_obj.write(data)
+            db_obj.delete_key(member.id)
+
+    async with db.DiscordDB("stream") as db_obj:
+        data = db_obj.get([])
+        if member.id in data:
+            data.remove(member.id)
+            db_obj.write(data)
 
 
 async def message_delete(msg: discord.Message):
     """
     This function is called for every message deleted by user.
     """
-    if msg.id in common.cmd_logs.keys():
-        del common.cmd_logs[msg.id]
-
-    elif msg.author.id == common.bot.user.id:
-        for log in common.cmd_logs.keys():
-            if common.cmd_logs[log].id is not None:
-                if common.cmd_logs[log].id == msg.id:
-                    del common.cmd_logs[log]
-                    return
+    cmd_logs.remove(msg.id)
 
     if common.GENERIC or common.TEST_MODE:
         return
@@ -202,8 +223,9 @@ async def message_edit(old: discord.Message, new: discord.Message):
     """
     if new.content.startswith(common.PREFIX):
         try:
-            if new.id in common.cmd_logs.keys():
-                await commands.handle(new, common.cmd_logs[new.id])
+            response_msg = cmd_logs.get_response(new)
+            if response_msg is not None:
+                await commands.handle(new, response_msg)
         except discord.HTTPException:
             pass
 
@@ -261,65 +283,135 @@ async def raw_reaction_add(payload: discord.RawReactionActionEvent):
                 await reaction.remove(user)
 
 
+class MessageStage:
+    """
+    A stage of handling messages posted by users. The handler of a stage is
+    only awaited if the cheap, synchronous check of the stage passes. Keeps
+    counters and timings of the stage, shown with the "stage_stats" command
+    """
+
+    def __init__(
+        self,
+        name: str,
+        check: Callable[[discord.Message], bool],
+        handler: Callable[[discord.Message], Awaitable[Any]],
+        final: bool,
+    ):
+        self.name = name
+        self.check = check
+        self.handler = handler
+        self.final = final
+
+        self.checked = 0
+        self.passed = 0
+        self.timing = Histogram()
+
+
+# Stages that every message goes through, in order. If a final stage runs, the
+# stages after it are skipped
+message_stages: list[MessageStage] = []
+
+
+def message_stage(check: Callable[[discord.Message], bool], final: bool = False):
+    """
+    Decorator to register an async function as a message stage, that runs if
+    check returns True for the message
+    """
+
+    def decorator(func: Callable[[discord.Message], Awaitable[Any]]):
+        message_stages.append(MessageStage(func.__name__, check, func, final))
+        return func
+
+    return decorator
+
+
+ENTRY_CHANNEL_IDS = frozenset(common.ServerConstants.ENTRY_CHANNEL_IDS.values())
+
+
+@message_stage(lambda msg: msg.type == discord.MessageType.premium_guild_subscription)
+async def stage_server_boost(msg: discord.Message):
+    await emotion.server_boost(msg)
+
+
+@message_stage(lambda msg: msg.content.startswith(common.PREFIX), final=True)
+async def stage_command(msg: discord.Message):
+    ret = await commands.handle(msg)
+    if ret is not None:
+        cmd_logs.add(msg.id, ret.id)
+
+    emotion.update("bored", -10)
+
+
+@message_stage(
+    lambda msg: not common.TEST_MODE
+    and emotion.trigger_matcher.classify(msg.content).bonks > 0
+)
+async def stage_bonk(msg: discord.Message):
+    await emotion.check_bonk(msg)
+
+
+@message_stage(
+    lambda msg: not common.TEST_MODE
+    and not common.GENERIC
+    and msg.channel.id in ENTRY_CHANNEL_IDS,
+    final=True,
+)
+async def stage_entry(msg: discord.Message):
+    if msg.channel.id == common.ServerConstants.ENTRY_CHANNEL_IDS["showcase"]:
+        entry_type = "showcase"
+        color = 0xFF8800
+    else:
+        entry_type = "resource"
+        color = 0x0000AA
+
+    title, fields = format_entries_message(msg, entry_type)
+    await embed_utils.send(
+        common.entries_discussion_channel,
+        title=title,
+        color=color,
+        fields=fields,
+    )
+
+
+@message_stage(
+    lambda msg: not common.TEST_MODE
+    and not common.GENERIC
+    and (
+        msg.author.id == 683852333293109269
+        or random.random() < emotion.get("happy") / 200
+    )
+)
+async def stage_dad_joke(msg: discord.Message):
+    await emotion.dad_joke(msg)
+
+
 async def handle_message(msg: discord.Message):
     """
-    Handle a message posted by user
+    Handle a message posted by user, by running it through the message stages
     """
-    if msg.type == discord.MessageType.premium_guild_subscription:
-        await emotion.server_boost(msg)
-
-    if msg.content.startswith(common.PREFIX):
-        ret = await commands.handle(msg)
-        if ret is not None:
-            common.cmd_logs[msg.id] = ret
-
-        if len(common.cmd_logs) > 100:
-            del common.cmd_logs[list(common.cmd_logs.keys())[0]]
-
-        await emotion.update("bored", -10)
-
-    elif not common.TEST_MODE:
-        await emotion.check_bonk(msg)
-
-        # Check for these specific messages, do not try to generalise, because we do not
-        # want the bot spamming the bydariogamer quote
-        # no_mentions = discord.AllowedMentions.none()
-        # if unidecode.unidecode(msg.content.lower()) in common.DEAD_CHAT_TRIGGERS:
-        #     # ded chat makes snek sad
-        #     await msg.channel.send(
-        #         "good." if await emotion.get("anger") >= 60 else common.BYDARIO_QUOTE,
-        #         allowed_mentions=no_mentions,
-        #     )
-        #     await emotion.update("happy", -8)
-        if common.GENERIC:
-            return
+    for stage in message_stages:
+        stage.checked += 1
+        if not stage.check(msg):
+            continue
 
-        if msg.channel in common.entry_channels.values():
-            if msg.channel.id == common.ServerConstants.ENTRY_CHANNEL_IDS["showcase"]:
-                entry_type = "showcase"
-                color = 0xFF8800
-            else:
-                entry_type = "resource"
-                color = 0x0000AA
-
-            title, fields = format_entries_message(msg, entry_type)
-            await embed_utils.send(
-                common.entries_discussion_channel,
-                title=title,
-                color=color,
-                fields=fields,
-            )
-        elif (
-            random.random() < await emotion.get("happy") / 200
-            or msg.author.id == 683852333293109269
-        ):
-            await emotion.dad_joke(msg)
+        stage.passed += 1
+        start = time.perf_counter()
+        try:
+            await stage.handler(msg)
+        finally:
+            stage.timing.record(time.perf_counter() - start)
+
+        if stage.final:
+            return
 
 
 def cleanup(*_):
     """
     Call cleanup functions
     """
+    common.bot.loop.run_until_complete(command_log.quit())
+    sandbox.quit()
+    common.bot.loop.run_until_complete(emotion.quit())
     common.bot.loop.run_until_complete(db.quit())
     common.bot.loop.run_until_complete(common.bot.close())
     common.bot.loop.close()
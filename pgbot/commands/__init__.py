@@ -9,14 +9,13 @@ This file exports a handle function, to handle commands posted by the users
 
 from __future__ import annotations
 
-import io
 import sys
 from typing import Union
 
 import discord
 
 from pgbot import common
-from pgbot.commands import admin, user
+from pgbot.commands import admin, command_log, scheduler, user
 from pgbot.utils import embed_utils, utils
 
 
@@ -105,28 +104,7 @@ async def handle(invoke_msg: discord.Message, response_msg: discord.Message = No
         )
 
     if not common.TEST_MODE and not common.GENERIC:
-        log_txt_file = None
-        escaped_cmd_text = discord.utils.escape_markdown(invoke_msg.content)
-        if len(escaped_cmd_text) > 2047:
-            with io.StringIO(invoke_msg.content) as log_buffer:
-                log_txt_file = discord.File(log_buffer, filename="command.txt")
-
-        await common.log_channel.send(
-            embed=embed_utils.create(
-                title=f"Command invoked by {invoke_msg.author} / {invoke_msg.author.id}",
-                description=escaped_cmd_text
-                if len(escaped_cmd_text) <= 2047
-                else escaped_cmd_text[:2044] + "...",
-                fields=(
-                    (
-                        "\u200b",
-                        f"by {invoke_msg.author.mention}\n**[View Original]({invoke_msg.jump_url})**",
-                        False,
-                    ),
-                ),
-            ),
-            file=log_txt_file,
-        )
+        command_log.add(invoke_msg)
 
     cmd = (
         admin.AdminCommand(invoke_msg, response_msg)
@@ -134,5 +112,5 @@ async def handle(invoke_msg: discord.Message, response_msg: discord.Message = No
         else user.UserCommand(invoke_msg, response_msg)
     )
     cmd.is_priv = is_priv
-    await cmd.handle_cmd()
+    await scheduler.run(cmd, is_admin)
     return response_msg
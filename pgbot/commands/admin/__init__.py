@@ -20,16 +20,41 @@ import discord
 import psutil
 import pygame
 
+# the message stages are defined in the pgbot package, which imports this
+# module, so its attributes are only looked up when commands run
+import pgbot
 from pgbot import common, db
 from pgbot.commands.admin.emsudo import EmsudoCommand
 from pgbot.commands.admin.sudo import SudoCommand
-from pgbot.commands.base import BotException, CodeBlock, String, add_group, no_dm
+from pgbot.commands.base import (
+    BotException,
+    CodeBlock,
+    String,
+    add_group,
+    cost_class,
+    no_dm,
+)
 from pgbot.commands.user import UserCommand
 from pgbot.utils import embed_utils, utils
+from pgbot.utils.stats import Histogram
 
 process = psutil.Process(os.getpid())
 
 
+def format_histogram(hist: Histogram):
+    """
+    Format the percentiles of a histogram of timings
+    """
+    if not hist.count:
+        return "-"
+
+    return (
+        f"p50 {utils.format_time(hist.percentile(50), 1)}, "
+        f"p99 {utils.format_time(hist.percentile(99), 1)}, "
+        f"max {utils.format_time(hist.max, 1)}"
+    )
+
+
 class AdminCommand(UserCommand, SudoCommand, EmsudoCommand):
     """
     Base class for all admin commands
@@ -109,9 +134,9 @@ class AdminCommand(UserCommand, SudoCommand, EmsudoCommand):
         -----
         Implement pg!db_read, to visualise DB messages
         """
-        async with db.DiscordDB(name) as db_obj:
+        async with db.DiscordDB(name, readonly=True) as db_obj:
             str_obj = black.format_str(
-                repr(db_obj.get()),
+                repr(db_obj.snapshot()),
                 mode=black.FileMode(),
             )
 
@@ -126,6 +151,80 @@ class AdminCommand(UserCommand, SudoCommand, EmsudoCommand):
         except discord.NotFound:
             pass
 
+    @add_group("db", "stats")
+    async def cmd_db_stats(self, *names: str):
+        """
+        ->type Admin commands
+        ->signature pg!db stats [*names]
+        ->description Show usage statistics of the DB tables
+        -----
+        Implement pg!db_stats, to show read/write counts, lock latencies and
+        sizes of DB tables
+        """
+        if not names:
+            names = tuple(sorted(db.db_stats))
+
+        fields = []
+        for name in names[:25]:
+            if name not in db.db_stats:
+                raise BotException(
+                    "Could not get DB stats", f"No stats of DB `{name}` exist"
+                )
+
+            stats = db.db_stats[name]
+            fields.append(
+                (
+                    name,
+                    f"Reads: `{stats.reads}`, snapshots: `{stats.snapshots}`, "
+                    f"writes: `{stats.writes}`\n"
+                    f"Lock waits ({stats.lock_wait.count}): "
+                    f"`{format_histogram(stats.lock_wait)}`\n"
+                    f"Lock holds: `{format_histogram(stats.lock_hold)}`\n"
+                    f"Size: `{utils.format_byte(stats.data_size)}` "
+                    f"(`{utils.format_byte(stats.blob_size)}` stored)\n"
+                    f"Flushes ({stats.flushes}): `{format_histogram(stats.flush_time)}`",
+                    False,
+                )
+            )
+
+        await embed_utils.replace(
+            self.response_msg,
+            title="DB stats",
+            description=(
+                "Usage statistics of the DB tables since the bot started"
+                if fields
+                else "No DB tables were used yet"
+            ),
+            fields=fields,
+        )
+
+    async def cmd_stage_stats(self):
+        """
+        ->type Admin commands
+        ->signature pg!stage_stats
+        ->description Show statistics of the stages that messages go through
+        -----
+        Implement pg!stage_stats, to show how often the message stages run and
+        how long they take
+        """
+        fields = []
+        for stage in pgbot.message_stages:
+            fields.append(
+                (
+                    stage.name,
+                    f"Checked: `{stage.checked}`, passed: `{stage.passed}`\n"
+                    f"Timings: `{format_histogram(stage.timing)}`",
+                    False,
+                )
+            )
+
+        await embed_utils.replace(
+            self.response_msg,
+            title="Message stage stats",
+            description="Statistics of the message stages since the bot started",
+            fields=fields,
+        )
+
     @no_dm
     @add_group("db", "write")
     async def cmd_db_write(self, name: str, data: Union[discord.Message, CodeBlock]):
@@ -166,6 +265,9 @@ class AdminCommand(UserCommand, SudoCommand, EmsudoCommand):
         async with db.DiscordDB(name) as db_obj:
             db_obj.write(eval(obj_str))  # pylint: disable = eval-used
 
+        if name == "feature":
+            await utils.load_channel_features()
+
         await embed_utils.replace(
             self.response_msg,
             title="DB overwritten!",
@@ -186,6 +288,9 @@ class AdminCommand(UserCommand, SudoCommand, EmsudoCommand):
             if not db_obj.delete():
                 raise BotException("Could not delete DB", "No such DB exists")
 
+        if name == "feature":
+            await utils.load_channel_features()
+
         await embed_utils.replace(
             self.response_msg,
             title="DB has been deleted!",
@@ -241,6 +346,7 @@ class AdminCommand(UserCommand, SudoCommand, EmsudoCommand):
             description=f"Successfully blacklisted {cnt} command(s)",
         )
 
+    @cost_class("heavy")
     async def cmd_clock(
         self,
         action: str = "",
@@ -262,6 +368,7 @@ class AdminCommand(UserCommand, SudoCommand, EmsudoCommand):
         return await super().cmd_clock(action, timezone, color, _member=member)
 
     @no_dm
+    @cost_class("sandbox")
     async def cmd_eval(self, code: CodeBlock):
         """
         ->type Admin commands
@@ -309,6 +416,7 @@ class AdminCommand(UserCommand, SudoCommand, EmsudoCommand):
             description=utils.code_block(repr(eval_output)),
         )
 
+    @cost_class("heavy")
     async def cmd_heap(self):
         """
         ->type Admin commands
@@ -337,6 +445,7 @@ class AdminCommand(UserCommand, SudoCommand, EmsudoCommand):
         a stub for the docs
         """
 
+    @cost_class("heavy")
     async def cmd_archive(
         self,
         origin: discord.TextChannel,
@@ -1364,14 +1473,13 @@ class AdminCommand(UserCommand, SudoCommand, EmsudoCommand):
             channels = (self.channel,)
 
         async with db.DiscordDB("feature") as db_obj:
-            db_dict = db_obj.get({})
-            if name not in db_dict:
-                db_dict[name] = {}
-
+            feature_dict = db_obj.get_key(name, {})
             for chan in channels:
-                db_dict[name][chan.id] = disable
+                feature_dict[chan.id] = disable
+
+            db_obj.set_key(name, feature_dict)
 
-            db_obj.write(db_dict)
+        utils.update_channel_feature(name, feature_dict)
 
         await embed_utils.replace(
             self.response_msg,
@@ -1381,10 +1489,4 @@ class AdminCommand(UserCommand, SudoCommand, EmsudoCommand):
 
 
 # monkey-patch admin command names into tuple
-common.admin_commands = tuple(
-    (
-        i[len(common.CMD_FUNC_PREFIX) :]
-        for i in dir(AdminCommand)
-        if i.startswith(common.CMD_FUNC_PREFIX)
-    )
-)
+common.admin_commands = tuple(AdminCommand.get_command_table()[0])
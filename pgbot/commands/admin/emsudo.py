@@ -24,6 +24,7 @@ from pgbot.commands.base import (
     CodeBlock,
     String,
     add_group,
+    cost_class,
 )
 from pgbot.utils import embed_utils, utils
 
@@ -1450,6 +1451,7 @@ class EmsudoCommand(BaseCommand):
             pass
 
     @add_group("emsudo", "clone")
+    @cost_class("heavy")
     async def cmd_emsudo_clone(
         self, *msgs: discord.Message, destination: Optional[common.Channel] = None
     ):
@@ -20,7 +20,13 @@ import psutil
 
 from pgbot import common
 from pgbot.utils import embed_utils, utils
-from pgbot.commands.base import BaseCommand, BotException, String, add_group
+from pgbot.commands.base import (
+    BaseCommand,
+    BotException,
+    String,
+    add_group,
+    cost_class,
+)
 
 process = psutil.Process(os.getpid())
 
@@ -917,6 +923,7 @@ class SudoCommand(BaseCommand):
             pass
 
     @add_group("sudo", "clone")
+    @cost_class("heavy")
     async def cmd_sudo_clone(
         self,
         *msgs: discord.Message,
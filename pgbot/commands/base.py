@@ -12,9 +12,10 @@ from __future__ import annotations
 
 import asyncio
 import datetime
+import functools
 import inspect
 import random
-from typing import Any, Optional, Union
+from typing import Any, Callable, NamedTuple, Optional, Union
 
 import discord
 import pygame
@@ -30,7 +31,7 @@ from pgbot.commands.parser import (
     split_tuple_anno,
     split_union_anno,
 )
-from pgbot.utils import embed_utils, utils
+from pgbot.utils import embed_utils, message_cache, utils
 
 
 def fun_command(func):
@@ -50,6 +51,19 @@ def no_dm(func):
     return func
 
 
+def cost_class(name: str):
+    """
+    A decorator to set the cost class of a command, one of the keys of
+    common.COMMAND_COST_LIMITS. Commands without one are "light"
+    """
+
+    def inner(func):
+        func.cost_class = name
+        return func
+
+    return inner
+
+
 def add_group(groupname: str, *subcmds: str):
     """
     Utility to add a function name to a group command
@@ -65,6 +79,254 @@ def add_group(groupname: str, *subcmds: str):
     return inner
 
 
+# annotations of the arguments that may need Discord API calls to be cast.
+# Arguments of these types are cast concurrently
+API_ANNOS = frozenset(
+    ("discord.Member", "discord.User", "discord.Message", "discord.Guild")
+)
+
+
+async def gather_casts(coros) -> list[Any]:
+    """
+    Run casts concurrently. If any of them fails, the error of the first one
+    is raised, just like when the casts are run one after another
+    """
+    results = await asyncio.gather(*coros, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+    return results
+
+
+class MemberResolver:
+    """
+    Resolves the members of a guild from their IDs. Members are looked up in
+    the cache of the guild first. The IDs that miss the cache at the same time
+    are batched into one gateway member query, and only the members that the
+    query does not return are fetched over REST
+    """
+
+    def __init__(self, guild: discord.Guild):
+        self.guild = guild
+        self.pending: dict[int, asyncio.Future] = {}
+        self.batch: Optional[asyncio.Task] = None
+
+    async def get(self, member_id: int) -> Optional[discord.Member]:
+        """
+        Get a member of the guild, None if there is no member with the ID
+        """
+        member = self.guild.get_member(member_id)
+        if member is not None:
+            return member
+
+        future = self.pending.get(member_id)
+        if future is None:
+            if not self.pending:
+                # the first miss schedules the batch, which runs after every
+                # concurrent cast has had the chance to add its miss to it
+                self.batch = asyncio.create_task(self.resolve_pending())
+
+            future = asyncio.get_running_loop().create_future()
+            self.pending[member_id] = future
+
+        # the future is shared by every cast of the same member
+        return await asyncio.shield(future)
+
+    async def fetch(self, member_id: int, future: asyncio.Future):
+        """
+        Fetch a member over REST, and set it as the result of a future
+        """
+        try:
+            future.set_result(await self.guild.fetch_member(member_id))
+        except discord.NotFound:
+            future.set_result(None)
+        except Exception as exc:
+            future.set_exception(exc)
+
+    async def resolve_pending(self):
+        """
+        Resolve all the members that missed the cache, in one batch
+        """
+        pending, self.pending = self.pending, {}
+        member_ids = list(pending)
+
+        try:
+            found: dict[int, discord.Member] = {}
+            try:
+                # the gateway only takes 100 IDs per query
+                for i in range(0, len(member_ids), 100):
+                    chunk = member_ids[i : i + 100]
+                    for member in await self.guild.query_members(
+                        user_ids=chunk, limit=len(chunk), cache=True
+                    ):
+                        found[member.id] = member
+
+            except Exception:
+                # fallback to fetching the members over REST
+                pass
+
+            fetches = []
+            for member_id, future in pending.items():
+                if member_id in found:
+                    future.set_result(found[member_id])
+                else:
+                    fetches.append(self.fetch(member_id, future))
+
+            await asyncio.gather(*fetches)
+
+        finally:
+            # the casts that wait for members must never be left hanging, the
+            # members that could not be resolved fail to cast
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ValueError())
+
+
+class CastPlan:
+    """
+    A plan to cast arguments to the type of a parameter annotation. It is
+    compiled once from the annotation string, so that no annotation is parsed
+    when commands are run. The plans of Union and tuple annotations are trees
+    of the plans of their elements
+    """
+
+    ANY = 0
+    BASIC = 1
+    UNION = 2
+    TUPLE = 3
+    VAR_TUPLE = 4
+
+    def __init__(self, anno: str):
+        self.anno = anno
+        self.subplans: tuple[CastPlan, ...] = ()
+
+        union_annos = list(split_union_anno(anno))
+        if len(union_annos) > 1:
+            self.kind = self.UNION
+            self.subplans = tuple(map(compile_cast_plan, union_annos))
+            self.uses_api = any(subplan.uses_api for subplan in self.subplans)
+            return
+
+        self.basic = union_annos[0]
+        tupled = split_tuple_anno(self.basic)
+        if self.basic == "Any":
+            self.kind = self.ANY
+        elif tupled is None:
+            self.kind = self.BASIC
+        elif len(tupled) == 2 and tupled[1] == "...":
+            self.kind = self.VAR_TUPLE
+            self.subplans = (compile_cast_plan(tupled[0]),)
+        else:
+            self.kind = self.TUPLE
+            self.subplans = tuple(map(compile_cast_plan, tupled))
+
+        # whether casting may need Discord API calls
+        self.uses_api = (self.kind == self.BASIC and self.basic in API_ANNOS) or any(
+            subplan.uses_api for subplan in self.subplans
+        )
+
+    @functools.cached_property
+    def error(self):
+        """
+        Error message to display to user when user has passed invalid arg
+        """
+        return get_anno_error(self.anno)
+
+    async def cast(self, cmd: BaseCommand, arg: Any) -> Any:
+        """
+        Cast an argument for a command. Raises ValueError on failure to cast
+        """
+        if self.kind == self.BASIC:
+            return await cmd.cast_basic_arg(self.basic, arg)
+
+        if self.kind == self.ANY:
+            # no checking/converting, do a direct return
+            return arg
+
+        if self.kind == self.UNION:
+            # try to cast to each element one by one
+            for subplan in self.subplans[:-1]:
+                try:
+                    return await subplan.cast(cmd, arg)
+                except ValueError:
+                    pass
+
+            return await self.subplans[-1].cast(cmd, arg)
+
+        if self.kind == self.VAR_TUPLE:
+            if not isinstance(arg, tuple):
+                # specialcase where we expected variable length tuple and got
+                # single element
+                return (await self.subplans[0].cast(cmd, arg),)
+
+            if self.uses_api:
+                return tuple(
+                    await gather_casts(self.subplans[0].cast(cmd, elem) for elem in arg)
+                )
+
+            return tuple([await self.subplans[0].cast(cmd, elem) for elem in arg])
+
+        # fixed length tuple
+        if not isinstance(arg, tuple) or len(self.subplans) != len(arg):
+            raise ValueError()
+
+        if self.uses_api:
+            return tuple(
+                await gather_casts(
+                    subplan.cast(cmd, elem) for subplan, elem in zip(self.subplans, arg)
+                )
+            )
+
+        return tuple(
+            [await subplan.cast(cmd, elem) for subplan, elem in zip(self.subplans, arg)]
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def compile_cast_plan(anno: str):
+    """
+    Get the casting plan of an annotation string. Plans are shared by all the
+    parameters with the same annotation
+    """
+    return CastPlan(anno)
+
+
+class CommandParam(NamedTuple):
+    """
+    A parameter of a command function, with its compiled casting plan
+    """
+
+    name: str
+    param: inspect.Parameter
+    plan: CastPlan
+
+    # whether the parameter is the first one and takes a message, in which case
+    # the message that the command replies to is passed to it
+    takes_reply: bool
+
+
+@functools.lru_cache(maxsize=None)
+def get_command_params(func: Callable) -> tuple[CommandParam, ...]:
+    """
+    Get the parameters of an unbound command function, without "self". The
+    signature is only inspected once per function
+    """
+    params = []
+    for i, param in enumerate(list(inspect.signature(func).parameters.values())[1:]):
+        anno = "Any" if param.annotation == param.empty else param.annotation
+        takes_reply = (
+            i == 0
+            and isinstance(anno, str)
+            and ("discord.Message" in anno or "discord.PartialMessage" in anno)
+        )
+        params.append(
+            CommandParam(param.name, param, compile_cast_plan(anno), takes_reply)
+        )
+
+    return tuple(params)
+
+
 class BaseCommand:
     """
     Base class for all commands. Defines the main utilities like argument
@@ -98,25 +360,58 @@ class BaseCommand:
         else:
             self.filesize_limit: int = self.guild.filesize_limit
 
-        # build self.groups and self.cmds_and_functions from class functions
-        self.cmds_and_funcs = {}  # this is a mapping from funtion name to funtion
-        self.groups = {}  # This is a mapping from group name to list of sub functions
-        for attr in dir(self):
-            if attr.startswith(common.CMD_FUNC_PREFIX):
-                func = self.__getattribute__(attr)
-                name = attr[len(common.CMD_FUNC_PREFIX) :]
-                self.cmds_and_funcs[name] = func
+        # resolves the members in the arguments, created on first use
+        self.member_resolver: Optional[MemberResolver] = None
 
-                if hasattr(func, "groupname"):
-                    if func.groupname in self.groups:
-                        self.groups[func.groupname].append(func)
-                    else:
-                        self.groups[func.groupname] = [func]
+        # the command string and its parsed args, if it was parsed before the
+        # command was called (to get its cost class)
+        self.parsed: Optional[tuple[str, tuple[str, list[Any], dict[str, Any]]]] = None
+
+        # command table of the class, this is shared by all instances of the
+        # class, so it must not be modified
+        self.cmds_and_funcs, self.groups = self.get_command_table()
 
         # page number, useful for PagedEmbed commands. 0 by deafult, gets modified
         # in pg!refresh command when invoked
         self.page: int = 0
 
+        # set by pg!refresh, when the command string was replaced with the
+        # command to refresh, which is run by the scheduler next
+        self.rerun: bool = False
+
+    @classmethod
+    def get_command_table(
+        cls,
+    ) -> tuple[dict[str, Callable], dict[str, list[Callable]]]:
+        """
+        Get the command table of the class, a mapping from command name to
+        command function, and a mapping from group name to the functions of
+        its sub commands, sorted by the number of sub commands in descending
+        order. The functions are not bound to an instance. The table is only
+        built once per class, on first use
+        """
+        table = cls.__dict__.get("_command_table")
+        if table is not None:
+            return table
+
+        cmds_and_funcs: dict[str, Callable] = {}
+        groups: dict[str, list[Callable]] = {}
+        for attr in dir(cls):
+            if attr.startswith(common.CMD_FUNC_PREFIX):
+                func = getattr(cls, attr)
+                cmds_and_funcs[attr[len(common.CMD_FUNC_PREFIX) :]] = func
+
+                if hasattr(func, "groupname"):
+                    groups.setdefault(func.groupname, []).append(func)
+
+        # sort so that call_cmd finds the most specific sub command first
+        for funcs in groups.values():
+            funcs.sort(key=lambda x: len(x.subcmds), reverse=True)
+
+        table = (cmds_and_funcs, groups)
+        cls._command_table = table
+        return table
+
     def get_guild(self):
         """
         Utility to retrieve self.guild. This function will raise BotException
@@ -199,14 +494,22 @@ class BaseCommand:
                 return role
 
             elif anno == "discord.Member":
-                try:
-                    return await self.get_guild().fetch_member(utils.filter_id(arg))
-                except discord.errors.NotFound:
+                if self.member_resolver is None:
+                    self.member_resolver = MemberResolver(self.get_guild())
+
+                member = await self.member_resolver.get(utils.filter_id(arg))
+                if member is None:
                     raise ValueError()
+                return member
 
             elif anno == "discord.User":
+                user_id = utils.filter_id(arg)
+                user = common.bot.get_user(user_id)
+                if user is not None:
+                    return user
+
                 try:
-                    return await common.bot.fetch_user(utils.filter_id(arg))
+                    return await common.bot.fetch_user(user_id)
                 except discord.errors.NotFound:
                     raise ValueError()
 
@@ -243,7 +546,7 @@ class BaseCommand:
                     chan = self.channel
 
                 try:
-                    return await chan.fetch_message(msg)
+                    return await message_cache.fetch(chan, msg)
                 except discord.NotFound:
                     raise ValueError()
 
@@ -276,87 +579,75 @@ class BaseCommand:
 
     async def cast_arg(
         self,
-        param: Union[inspect.Parameter, str],
+        param: CommandParam,
         arg: Any,
         cmd: str,
         key: Optional[str] = None,
-        convert_error: bool = True,
     ) -> Any:
         """
-        Cast an argument to the type mentioned by the paramenter annotation
+        Cast an argument to the type mentioned by the paramenter annotation,
+        by running the compiled casting plan of the parameter
         """
-        if isinstance(param, str):
-            anno = param
-        else:
-            if param.annotation == param.empty:
-                # no checking/converting, do a direct return
-                return arg
-
-            anno: str = param.annotation
-
-        if anno == "Any":
-            # no checking/converting, do a direct return
-            return arg
-
-        union_annos = list(split_union_anno(anno))
-        last_anno = union_annos.pop()
-
-        for union_anno in union_annos:
-            # we are in a union argument type, try to cast to each element one
-            # by one
-            try:
-                return await self.cast_arg(union_anno, arg, cmd, key, False)
-            except ValueError:
-                pass
-
-        tupled = split_tuple_anno(last_anno)
         try:
-            if tupled is None:
-                # got a basic argument
-                return await self.cast_basic_arg(last_anno, arg)
+            return await param.plan.cast(self, arg)
+        except ValueError:
+            if key is None:
+                if param.param.kind == param.param.VAR_POSITIONAL:
+                    key = "Each of the variable arguments"
+                else:
+                    key = "Each of the variable keyword arguments"
+            else:
+                key = f"The argument `{key}`"
 
-            if not isinstance(arg, tuple):
-                if len(tupled) == 2 and tupled[1] == "...":
-                    # specialcase where we expected variable length tuple and
-                    # got single element
-                    return (await self.cast_arg(tupled[0], arg, cmd, key, False),)
+            raise ArgError(f"{key} must be {param.plan.error}.", cmd)
 
-                raise ValueError()
+    def get_cmd_func(self, cmd: str, args: list[Any]) -> tuple[Callable, list[Any]]:
+        """
+        Get the unbound function of a parsed command, and the args that are
+        left after the sub command names of a group command. Raises
+        BotException if there is no such command
+        """
+        # First check if it is a group command, and handle it.
+        # get the func object
+        if cmd in self.groups:
+            # iterate over group commands sorted in descending order, so that
+            # we find the correct match
+            for func in self.groups[cmd]:
+                n = len(func.subcmds)
+                if func.subcmds == tuple(args[:n]):
+                    return func, args[n:]
 
-            if len(tupled) == 2 and tupled[1] == "...":
-                # variable length tuple
-                return tuple(
-                    [
-                        await self.cast_arg(tupled[0], elem, cmd, key, False)
-                        for elem in arg
-                    ]
+        if cmd not in self.cmds_and_funcs:
+            if cmd in common.admin_commands:
+                raise BotException(
+                    "Permissions Error!",
+                    f"The command '{cmd}' is an admin command, and you do "
+                    "not have access to that",
                 )
 
-            # fixed length tuple
-            if len(tupled) != len(arg):
-                raise ValueError()
-
-            return tuple(
-                [
-                    await self.cast_arg(i, j, cmd, key, False)
-                    for i, j in zip(tupled, arg)
-                ]
+            raise BotException(
+                "Unrecognized command!",
+                f"The command '{cmd}' does not exist.\nFor help on bot "
+                "commands, do `pg!help`",
             )
 
-        except ValueError:
-            if not convert_error:
-                # Just forward value error in this case
-                raise
+        return self.cmds_and_funcs[cmd], args
 
-            if key is None and not isinstance(param, str):
-                if param.kind == param.VAR_POSITIONAL:
-                    key = "Each of the variable arguments"
-                else:
-                    key = "Each of the variable keyword arguments"
-            else:
-                key = f"The argument `{key}`"
+    def get_cost_class(self) -> str:
+        """
+        Get the cost class of the command, without running it. Commands that
+        cannot be parsed are "light", since they only report an error
+        """
+        try:
+            parsed = parse_args(self.cmd_str)
+            func, _ = self.get_cmd_func(parsed[0], parsed[1])
+        except BotException:
+            return "light"
 
-            raise ArgError(f"{key} must be {get_anno_error(anno)}.", cmd)
+        # the command is called with these args, instead of parsing it again
+        self.parsed = (self.cmd_str, parsed)
+
+        return getattr(func, "cost_class", "light")
 
     async def call_cmd(self):
         """
@@ -367,11 +658,15 @@ class BaseCommand:
         before calling the actual function. Relies on argument annotations to
         cast args/kwargs to the types required by the function
         """
-        cmd, args, kwargs = parse_args(self.cmd_str)
+        parsed, self.parsed = self.parsed, None
+        if parsed is not None and parsed[0] == self.cmd_str:
+            cmd, args, kwargs = parsed[1]
+        else:
+            cmd, args, kwargs = parse_args(self.cmd_str)
 
         # command has been blacklisted from running
-        async with db.DiscordDB("blacklist") as db_obj:
-            if cmd in db_obj.get([]):
+        async with db.DiscordDB("blacklist", readonly=True) as db_obj:
+            if cmd in db_obj.snapshot([]):
                 raise BotException(
                     "Cannot execute comamand!",
                     f"The command '{cmd}' has been temporarily been blocked from "
@@ -380,37 +675,7 @@ class BaseCommand:
                     "has been finished",
                 )
 
-        # First check if it is a group command, and handle it.
-        # get the func object
-        is_group = False
-        func = None
-        if cmd in self.groups:
-            # iterate over group commands sorted in descending order, so that
-            # we find the correct match
-            for func in sorted(
-                self.groups[cmd], key=lambda x: len(x.subcmds), reverse=True
-            ):
-                n = len(func.subcmds)
-                if func.subcmds == tuple(args[:n]):
-                    args = args[n:]
-                    is_group = True
-                    break
-
-        if not is_group:
-            if cmd not in self.cmds_and_funcs:
-                if cmd in common.admin_commands:
-                    raise BotException(
-                        "Permissions Error!",
-                        f"The command '{cmd}' is an admin command, and you do "
-                        "not have access to that",
-                    )
-
-                raise BotException(
-                    "Unrecognized command!",
-                    f"The command '{cmd}' does not exist.\nFor help on bot "
-                    "commands, do `pg!help`",
-                )
-            func = self.cmds_and_funcs[cmd]
+        func, args = self.get_cmd_func(cmd, args)
 
         if hasattr(func, "no_dm") and self.is_dm:
             raise BotException(
@@ -419,7 +684,7 @@ class BaseCommand:
             )
 
         if hasattr(func, "fun_cmd"):
-            if await utils.get_channel_feature("nofun", self.channel):
+            if utils.get_channel_feature("nofun", self.channel):
                 raise BotException(
                     "Could not run command!",
                     "This command is a 'fun' command, and is not allowed "
@@ -427,7 +692,7 @@ class BaseCommand:
                     "some other channel.",
                 )
 
-            bored = await emotion.get("bored")
+            bored = emotion.get("bored")
             if bored < -60 and -bored / 100 >= random.random():
                 raise BotException(
                     "I am Exhausted!",
@@ -435,7 +700,7 @@ class BaseCommand:
                     "Give me a bit of a break, and I will be back to normal!",
                 )
 
-            confused = await emotion.get("confused")
+            confused = emotion.get("confused")
             if confused > 60 and random.random() < confused / 400:
                 await embed_utils.replace(
                     self.response_msg,
@@ -451,8 +716,10 @@ class BaseCommand:
                 )
                 await asyncio.sleep(0.5)
 
-        if func is None:
-            raise BotException("Internal bot error", "This should never happen kek")
+        params = get_command_params(func)
+
+        # bind the function from the command table to this instance
+        func = func.__get__(self, type(self))
 
         # If user has put an attachment, check whether it's a text file, and
         # handle as code block
@@ -468,8 +735,6 @@ class BaseCommand:
 
                 args.append(CodeBlock(contents.decode(), ext))
 
-        sig = inspect.signature(func)
-
         i = -1
         is_var_pos = is_var_key = False
         keyword_only_args = []
@@ -477,24 +742,21 @@ class BaseCommand:
 
         # iterate through function parameters, arrange the given args and
         # kwargs in the order and format the function wants
-        for i, key in enumerate(sig.parameters):
-            param = sig.parameters[key]
+        for i, cmd_param in enumerate(params):
+            key, param = cmd_param.name, cmd_param.param
             iskw = False
 
             if param.kind not in [param.POSITIONAL_ONLY, param.VAR_POSITIONAL]:
                 all_keywords.append(key)
 
-            if (
-                i == 0
-                and isinstance(param.annotation, str)
-                and (
-                    "discord.Message" in param.annotation
-                    or "discord.PartialMessage" in param.annotation
-                )
-            ):
+            if cmd_param.takes_reply:
                 # first arg is expected to be a Message object, handle reply into
                 # the first argument
                 if self.invoke_msg.reference is not None:
+                    if isinstance(self.invoke_msg.reference.resolved, discord.Message):
+                        # discord sends the replied message, no need to fetch it
+                        message_cache.add(self.invoke_msg.reference.resolved)
+
                     msg = str(self.invoke_msg.reference.message_id)
                     if self.invoke_msg.reference.channel_id != self.channel.id:
                         msg = str(self.invoke_msg.reference.channel_id) + "/" + msg
@@ -503,15 +765,21 @@ class BaseCommand:
 
             if param.kind == param.VAR_POSITIONAL:
                 is_var_pos = True
+                if cmd_param.plan.uses_api:
+                    args[i:] = await gather_casts(
+                        self.cast_arg(cmd_param, arg, cmd) for arg in args[i:]
+                    )
+                    continue
+
                 for j in range(i, len(args)):
-                    args[j] = await self.cast_arg(param, args[j], cmd)
+                    args[j] = await self.cast_arg(cmd_param, args[j], cmd)
                 continue
 
             elif param.kind == param.VAR_KEYWORD:
                 is_var_key = True
                 for j in kwargs:
                     if j not in keyword_only_args:
-                        kwargs[j] = await self.cast_arg(param, kwargs[j], cmd)
+                        kwargs[j] = await self.cast_arg(cmd_param, kwargs[j], cmd)
                 continue
 
             elif param.kind == param.KEYWORD_ONLY:
@@ -547,9 +815,9 @@ class BaseCommand:
 
             # cast the argument into the required type
             if iskw:
-                kwargs[key] = await self.cast_arg(param, kwargs[key], cmd, key)
+                kwargs[key] = await self.cast_arg(cmd_param, kwargs[key], cmd, key)
             else:
-                args[i] = await self.cast_arg(param, args[i], cmd, key)
+                args[i] = await self.cast_arg(cmd_param, args[i], cmd, key)
 
         i += 1
         # More arguments were given than required
@@ -570,11 +838,11 @@ class BaseCommand:
         """
         try:
             await self.call_cmd()
-            await emotion.update("confused", -random.randint(4, 8))
+            emotion.update("confused", -random.randint(4, 8))
             return
 
         except ArgError as exc:
-            await emotion.update("confused", random.randint(2, 6))
+            emotion.update("confused", random.randint(2, 6))
             title = "Invalid Arguments!"
             if len(exc.args) == 2:
                 msg, cmd = exc.args
@@ -584,7 +852,7 @@ class BaseCommand:
             excname = "Argument Error"
 
         except KwargError as exc:
-            await emotion.update("confused", random.randint(2, 6))
+            emotion.update("confused", random.randint(2, 6))
             title = "Invalid Keyword Arguments!"
             if len(exc.args) == 2:
                 msg, cmd = exc.args
@@ -595,17 +863,17 @@ class BaseCommand:
             excname = "Keyword argument Error"
 
         except BotException as exc:
-            await emotion.update("confused", random.randint(4, 8))
+            emotion.update("confused", random.randint(4, 8))
             title, msg = exc.args
             excname = "BotException"
 
         except discord.HTTPException as exc:
-            await emotion.update("confused", random.randint(7, 13))
+            emotion.update("confused", random.randint(7, 13))
             title, msg = exc.__class__.__name__, exc.args[0]
             excname = "discord.HTTPException"
 
         except Exception:
-            await emotion.update("confused", random.randint(10, 22))
+            emotion.update("confused", random.randint(10, 22))
             await embed_utils.replace(
                 self.response_msg,
                 title="Unknown Error!",
@@ -0,0 +1,192 @@
+"""
+This file is a part of the source code for the PygameCommunityBot.
+This project has been licensed under the MIT license.
+Copyright (c) 2020-present PygameCommunityDiscord
+
+This file defines the command log, that records the commands run by users in
+the log channel. Commands are queued to be logged, and a background routine
+sends the queued logs in batches of up to 10 embeds per message (posted over
+the HTTP API directly, discord.py 1.7 only sends one embed per message). When
+the queue is full, commands are logged in a text file digest instead, and
+beyond that only counted, so logging never holds up the commands themselves
+"""
+
+from __future__ import annotations
+
+import collections
+import io
+from typing import Optional
+
+import discord
+from discord.ext import tasks
+from discord.http import Route
+
+from pgbot import common
+from pgbot.utils import embed_utils
+
+# discord limits on the embeds of one message
+MAX_EMBEDS = 10
+MAX_EMBEDS_LENGTH = 6000
+
+# the logs that are waiting to be sent, as embeds and the full text of the
+# commands that are too long for an embed
+pending: collections.deque[tuple[discord.Embed, Optional[str]]] = collections.deque()
+
+# lines of the digest of the commands that did not fit in the queue, and the
+# number of commands that did not fit in the digest either
+digest: list[str] = []
+dropped = 0
+
+
+def add(invoke_msg: discord.Message):
+    """
+    Queue a command to be logged. This never waits
+    """
+    global dropped
+
+    if len(pending) < common.COMMAND_LOG_QUEUE_SIZE:
+        pending.append(create_entry(invoke_msg))
+
+    elif len(digest) < common.COMMAND_LOG_DIGEST_SIZE:
+        digest.append(
+            f"[{invoke_msg.created_at.isoformat(' ', 'seconds')}] "
+            f"{invoke_msg.author} / {invoke_msg.author.id} ({invoke_msg.jump_url}): "
+            f"{invoke_msg.content}"
+        )
+    else:
+        dropped += 1
+
+
+def create_entry(invoke_msg: discord.Message):
+    """
+    Create the log embed of a command, and get the full text of the command
+    if it does not fit in the embed
+    """
+    escaped_cmd_text = discord.utils.escape_markdown(invoke_msg.content)
+    embed = embed_utils.create(
+        title=f"Command invoked by {invoke_msg.author} / {invoke_msg.author.id}",
+        description=escaped_cmd_text
+        if len(escaped_cmd_text) <= 2047
+        else escaped_cmd_text[:2044] + "...",
+        fields=(
+            (
+                "\u200b",
+                f"by {invoke_msg.author.mention}\n**[View Original]({invoke_msg.jump_url})**",
+                False,
+            ),
+        ),
+        # logs are sent a bit later, so they show when the command was run
+        timestamp=invoke_msg.created_at,
+    )
+    return embed, invoke_msg.content if len(escaped_cmd_text) > 2047 else None
+
+
+async def send_embeds(embeds: list[discord.Embed]):
+    """
+    Send a message with many embeds to the log channel
+    """
+    await common.bot.http.request(
+        Route(
+            "POST",
+            "/channels/{channel_id}/messages",
+            channel_id=common.log_channel.id,
+        ),
+        json={"embeds": [embed.to_dict() for embed in embeds]},
+    )
+
+
+async def send_pending():
+    """
+    Send the queued logs, in as few messages as possible. Logs of commands
+    that are too long for an embed are sent on their own, with the full
+    command as a text file
+    """
+    while pending:
+        embed, full_text = pending.popleft()
+        if full_text is not None:
+            with io.StringIO(full_text) as log_buffer:
+                await common.log_channel.send(
+                    embed=embed,
+                    file=discord.File(log_buffer, filename="command.txt"),
+                )
+            continue
+
+        embeds = [embed]
+        length = len(embed)
+        while pending and len(embeds) < MAX_EMBEDS:
+            embed, full_text = pending[0]
+            if full_text is not None or length + len(embed) > MAX_EMBEDS_LENGTH:
+                break
+
+            pending.popleft()
+            embeds.append(embed)
+            length += len(embed)
+
+        await send_embeds(embeds)
+
+
+async def send_digest():
+    """
+    Send the commands that did not fit in the queue, as a text file
+    """
+    global dropped
+
+    if not digest and not dropped:
+        return
+
+    # more commands can be added to the digest while it is being sent, only
+    # the ones that were sent are removed afterwards. If sending fails, they
+    # stay in the digest to be sent the next time
+    digest_len = len(digest)
+    dropped_count = dropped
+
+    text = "\n".join(digest)
+    message = f"{digest_len} command(s) were logged in a digest, the log was busy"
+    if dropped_count:
+        message += f". {dropped_count} more command(s) were not logged at all"
+
+    await common.log_channel.send(
+        message,
+        file=discord.File(io.StringIO(text), filename="commands.txt"),
+    )
+
+    del digest[:digest_len]
+    dropped -= dropped_count
+
+
+async def flush():
+    """
+    Send everything that is waiting to be logged
+    """
+    try:
+        await send_pending()
+        await send_digest()
+    except Exception as exc:
+        # the logs that could not be sent are lost, but that must not stop the
+        # writer from sending the next ones, whatever the error was
+        print("Failed to send command logs:", exc)
+
+
+@tasks.loop(seconds=common.COMMAND_LOG_INTERVAL)
+async def writer():
+    """
+    Routine that sends the queued logs in the background
+    """
+    await flush()
+
+
+def init():
+    """
+    Start logging commands, call this function after the log channel is set
+    """
+    # this runs again when the bot reconnects, the writer is still running then
+    if not writer.is_running():
+        writer.start()
+
+
+async def quit():
+    """
+    Send the logs that are still queued, and stop logging commands
+    """
+    writer.cancel()
+    await flush()
@@ -8,6 +8,7 @@ This file defines the main utility functions for the argument parser
 
 from __future__ import annotations
 
+import re
 from typing import Any, Optional
 
 
@@ -109,52 +110,58 @@ class String:
         """
         Convert a "raw" string to one where characters are escaped
         """
-        cnt = 0
-        newstr = ""
-        while cnt < len(string):
-            char = string[cnt]
-            cnt += 1
-            if char == "\\":
-                # got a backslash, handle escapes
-                char = string[cnt]
-                cnt += 1
-                if char.lower() in ["x", "u"]:  # these are unicode escapes
-                    if char.lower() == "x":
-                        n = 2
-                    else:
-                        n = 4 if char == "u" else 8
-
-                    var = string[cnt : cnt + n]
-                    try:
-                        if len(var) != n:
-                            n = len(var)
-                            raise ValueError()
-
-                        newstr += chr(int(var, base=16))
-                    except (ValueError, OverflowError):
-                        esc = string[cnt - 2 : cnt + n]
-                        raise BotException(
-                            "Invalid escape character",
-                            f"Invalid unicode escape: `{esc}` in string",
-                        )
-                    cnt += n
-
-                elif char in ESCAPES:
-                    # general escapes
-                    newstr += ESCAPES[char]
+        # the text between escapes is copied in slices, and joined at the end
+        parts: list[str] = []
+        prev = 0
+        cnt = string.find("\\")
+        while cnt != -1:
+            parts.append(string[prev:cnt])
+
+            # got a backslash, handle escapes
+            char = string[cnt + 1]
+            cnt += 2
+            if char in "xXuU":  # these are unicode escapes
+                if char in "xX":
+                    n = 2
                 else:
+                    n = 4 if char == "u" else 8
+
+                var = string[cnt : cnt + n]
+                try:
+                    if len(var) != n:
+                        n = len(var)
+                        raise ValueError()
+
+                    parts.append(chr(int(var, base=16)))
+                except (ValueError, OverflowError):
+                    esc = string[cnt - 2 : cnt + n]
                     raise BotException(
                         "Invalid escape character",
-                        f"Unknown escape `\\{char}`",
+                        f"Invalid unicode escape: `{esc}` in string",
                     )
+                cnt += n
+
+            elif char in ESCAPES:
+                # general escapes
+                parts.append(ESCAPES[char])
             else:
-                newstr += char
+                raise BotException(
+                    "Invalid escape character",
+                    f"Unknown escape `\\{char}`",
+                )
+
+            prev = cnt
+            cnt = string.find("\\", prev)
 
-        return newstr
+        parts.append(string[prev:])
+        return "".join(parts)
 
 
 SPLIT_FLAGS = (("`", CodeBlock), ('"', String), ("'", String))
 
+# matches the characters that can start a code block or a string
+SPLIT_START = re.compile("[`\"']")
+
 
 def split_anno(anno: str):
     """
@@ -258,71 +265,76 @@ def split_args(split_str: str):
     on seperators like code ticks and quotes (strings).
     Returns a generator of Codeblock objects, String objects and str.
     """
-    split_state = -1  # indicates parsing state, -1 means "None" parse state
-    is_multiline = False  # indicates whether the block being parsed is None or not
     prev = 0  # index of last unparsed character
-
-    for cnt, char in enumerate(split_str):
-        if prev > cnt:
-            # skipped a few characters, so prev is greater than cnt
+    pos = 0  # index to continue searching from
+
+    # jump from one split char to the next, instead of checking every character
+    while True:
+        match = SPLIT_START.search(split_str, pos)
+        if match is None:
+            break
+
+        cnt = match.start()
+        pos = cnt + 1
+        if cnt and split_str[cnt - 1] == "\\":
+            # got split char, but is escaped, so skip it
             continue
 
-        for state, (matchchar, splitfunc) in enumerate(SPLIT_FLAGS):
-            if split_state != -1 and state != split_state:
-                # if we are parsing one type of split, ignore all other types
-                continue
+        matchchar = match.group()
+        splitfunc = CodeBlock if matchchar == "`" else String
+        is_multiline = split_str[cnt + 1 : cnt + 3] == 2 * matchchar
+
+        ret = split_str[prev:cnt]
+        if ret:
+            yield ret  # yield any regular string segments
+
+        prev = pos
+        if is_multiline:
+            # the next chars are skipped
+            prev += 2
+
+        # search for the end of the block
+        pos = prev
+        while True:
+            end = split_str.find(matchchar, pos)
+            if not is_multiline:
+                stop = len(split_str) if end == -1 else end
+                if split_str.find("\n", pos, stop) != -1:
+                    # got newline while parsing non-multiline block
+                    raise BotException(
+                        f"Invalid {splitfunc.__name__} formatting!",
+                        f"Use triple quotes/ticks for multiline blocks",
+                    )
 
-            if char == "\n" and split_state != -1 and not is_multiline:
-                # got newline while parsing non-multiline block
+            if end == -1:
+                # the block was not closed
+                name = splitfunc.__name__
                 raise BotException(
-                    f"Invalid {splitfunc.__name__} formatting!",
-                    f"Use triple quotes/ticks for multiline blocks",
+                    f"Invalid {name}!",
+                    f"The {name.lower()} was not properly closed",
                 )
 
-            if char == matchchar:
-                if cnt and split_str[cnt - 1] == "\\":
-                    # got split char, but is escaped, so break
-                    break
-
-                old_multiline = is_multiline
-                is_multiline = split_str[cnt + 1 : cnt + 3] == 2 * matchchar
-
-                if split_state != -1:
-                    if is_multiline and not old_multiline:
-                        # got closing triple quote but no opening triple quote
-                        is_multiline = False
-
-                    elif old_multiline and not is_multiline:
-                        # not a close at all
-                        is_multiline = True
-                        continue
-
-                ret = split_str[prev:cnt]
-                if split_state == -1:
-                    # start of new parse state
-                    split_state = state
-                    if ret:
-                        yield ret  # yield any regular string segments
-
-                else:
-                    # end of a parse state, yield token and reset state
-                    split_state = -1
-                    yield splitfunc(ret)
+            pos = end + 1
+            if split_str[end - 1] == "\\":
+                # got split char, but is escaped
+                continue
 
-                prev = cnt + 1
+            if split_str[end + 1 : end + 3] == 2 * matchchar:
                 if is_multiline:
-                    # the next chars are skipped
-                    prev += 2
+                    # end of a multiline block, the next chars are skipped
+                    pos += 2
 
-                break
+                # else, got closing triple quote but no opening triple quote,
+                # so the block ends at the first quote
 
-    if split_state != -1:
-        # we were still in a parse state
-        name = SPLIT_FLAGS[split_state][1].__name__
-        raise BotException(
-            f"Invalid {name}!",
-            f"The {name.lower()} was not properly closed",
-        )
+            elif is_multiline:
+                # not a close at all
+                continue
+
+            # end of a parse state, yield token
+            yield splitfunc(split_str[prev:end])
+            prev = pos
+            break
 
     # yield trailing string
     ret = split_str[prev:]
@@ -339,7 +351,8 @@ def parse_args(cmd_str: str):
     """
     args: list[Any] = []
     kwargs: dict[str, Any] = {}
-    temp_list: Optional[list[Any]] = None  # used to store the temporary tuple
+    # used to store the temporary tuples being parsed, innermost one last
+    tuple_stack: list[list[Any]] = []
 
     kwstart = False  # used to make sure that keyword args come after args
     prevkey = None  # temporarily store previous key name
@@ -349,13 +362,9 @@ def parse_args(cmd_str: str):
         Internal helper funtion to append a parsed argument into arg/kwarg/tuple
         """
         nonlocal prevkey
-        if temp_list is not None:
+        if tuple_stack:
             # already in a tuple, flush arg into that
-            temp = temp_list
-            while temp and isinstance(temp[-1], list):
-                temp = temp[-1]
-
-            temp.append(arg)
+            tuple_stack[-1].append(arg)
         else:
             if prevkey is not None:
                 # had a keyword, flush arg into keyword
@@ -392,10 +401,14 @@ def parse_args(cmd_str: str):
                 # got first keyword, mark a flag so that future arguments are
                 # all keywords
                 kwstart = True
-                if temp_list is not None:
+                if tuple_stack:
                     # we were parsing a tuple, and got keyword arg
                     raise KwargError("Keyword arguments cannot come inside a tuple")
 
+                if not splits[0]:
+                    # we do not have keyword name
+                    raise KwargError("Missing keyword before '=' symbol")
+
                 # underscores not allowed at start of keyword names here
                 if not splits[0][0].isalpha():
                     raise KwargError("Keyword argument must begin with an alphabet")
@@ -406,9 +419,6 @@ def parse_args(cmd_str: str):
                     raise KwargError("Did not specify argument after '='")
 
                 prevkey = splits[0]
-                if not prevkey:
-                    # we do not have keyword name
-                    raise KwargError("Missing keyword before '=' symbol")
 
                 if splits[1]:
                     # flush kwarg
@@ -417,20 +427,11 @@ def parse_args(cmd_str: str):
 
             elif len(splits) == 1:
                 # current substring is not a keyword (does not have =)
-                while substr.startswith("("):
+                oldlen = len(substr)
+                substr = substr.lstrip("(")
+                for _ in range(oldlen - len(substr)):
                     # start of a tuple
-                    if temp_list is not None:
-                        temp = temp_list
-                        while temp and isinstance(temp[-1], list):
-                            temp = temp[-1]
-
-                        temp.append([])
-                    else:
-                        temp_list = []
-
-                    substr = substr[1:]
-                    if not substr:
-                        continue
+                    tuple_stack.append([])
 
                 oldlen = len(substr)
                 substr = substr.rstrip(")")
@@ -440,25 +441,15 @@ def parse_args(cmd_str: str):
 
                 for _ in range(count):
                     # end of a tuple
-                    if temp_list is None:
+                    if not tuple_stack:
                         raise ArgError("Invalid closing tuple bracket")
 
-                    prevtemp = None
-                    temp = temp_list
-                    while temp and isinstance(temp[-1], list):
-                        prevtemp = temp
-                        temp = temp[-1]
-
-                    if prevtemp is None:
-                        arg = tuple(temp)
-                        temp_list = None
-                        append_arg(arg)
-                    else:
-                        prevtemp[-1] = tuple(temp)
+                    # the closed tuple goes into the outer tuple, if any
+                    append_arg(tuple(tuple_stack.pop()))
             else:
                 raise KwargError("Invalid number of '=' in keyword argument expression")
 
-    if temp_list is not None:
+    if tuple_stack:
         raise ArgError("Tuple was not closed")
 
     if prevkey:
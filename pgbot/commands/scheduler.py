@@ -0,0 +1,315 @@
+"""
+This file is a part of the source code for the PygameCommunityBot.
+This project has been licensed under the MIT license.
+Copyright (c) 2020-present PygameCommunityDiscord
+
+This file defines the command scheduler, that admits commands before they are
+run. Every user has a token bucket that limits how fast they can run
+commands, and every cost class of commands has a limit on how many of its
+commands run at once. Commands that cannot run yet wait in a queue, and see
+their position in it as it advances. Queued commands of the same priority
+take turns between users, so that one user cannot fill a queue. Admin commands
+skip the token buckets, and are run before the queued commands of other users
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import time
+from typing import Iterator, Optional
+
+import discord
+
+from pgbot import common
+from pgbot.commands.base import BaseCommand
+from pgbot.utils import embed_utils
+
+# priorities of the commands in the queues, lower ones run first
+ADMIN_PRIORITY = 0
+USER_PRIORITY = 1
+
+
+class TokenBucket:
+    """
+    A bucket of tokens that refills at a constant rate, up to a burst size
+    """
+
+    def __init__(self, burst: int, interval: float):
+        self.burst = burst
+        self.interval = interval
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+
+    def refill(self):
+        """
+        Add the tokens that were refilled since the last refill
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) / self.interval)
+        self.last = now
+
+    def is_full(self):
+        self.refill()
+        return self.tokens >= self.burst
+
+    def take(self, max_wait: float) -> Optional[float]:
+        """
+        Take a token, returns the number of seconds to wait until the token is
+        refilled, or None (without taking the token) if that is longer than
+        max_wait. Tokens are taken in advance, so that the commands of a user
+        run in order
+        """
+        self.refill()
+        wait = max(0.0, (1 - self.tokens) * self.interval)
+        if wait > max_wait:
+            return None
+
+        self.tokens -= 1
+        return wait
+
+
+class CostClass:
+    """
+    A class of commands, of which only a limited number run at once. The rest
+    wait in a priority queue, where the users take turns
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.running = 0
+
+        # queues of the commands of every priority, every queue maps users to
+        # the futures of their commands. The user whose turn it is comes first,
+        # after their turn they are moved to the end
+        self.queues: dict[
+            int, collections.OrderedDict[int, collections.deque[asyncio.Future]]
+        ] = {}
+
+        # positions of the queued commands, built when they are needed after
+        # the queue changed
+        self.positions: Optional[dict[asyncio.Future, int]] = None
+
+        # future that is done the next time the queue advances, so that the
+        # queued commands can show their new positions
+        self.advanced: Optional[asyncio.Future] = None
+
+    def try_acquire(self):
+        """
+        Take a slot to run a command right away, if there is one free and no
+        command is waiting for one
+        """
+        if self.running < self.limit and not self.queues:
+            self.running += 1
+            return True
+
+        return False
+
+    def enqueue(self, priority: int, user_id: int):
+        """
+        Queue a command, returns a future that is done when a slot is taken
+        for it
+        """
+        future = asyncio.get_running_loop().create_future()
+        queue = self.queues.setdefault(priority, collections.OrderedDict())
+        queue.setdefault(user_id, collections.deque()).append(future)
+        self.positions = None
+        return future
+
+    def cancel(self, future: asyncio.Future):
+        """
+        Cancel a queued command, it is removed from the queue when its turn
+        comes
+        """
+        future.cancel()
+        self.positions = None
+
+    def iter_queued(self) -> Iterator[asyncio.Future]:
+        """
+        Iterate over the queued commands, in the order in which they run
+        """
+        for priority in sorted(self.queues):
+            # take the commands of the users in turns, until all run out
+            queue = self.queues[priority]
+            users = collections.deque(iter(futures) for futures in queue.values())
+            while users:
+                user = users.popleft()
+                future = next(user, None)
+                if future is not None:
+                    yield future
+                    users.append(user)
+
+    def position(self, future: asyncio.Future):
+        """
+        Get the position of a queued command in the queue, starting from 1
+        """
+        if self.positions is None:
+            queued = (fut for fut in self.iter_queued() if not fut.done())
+            self.positions = {fut: pos for pos, fut in enumerate(queued, 1)}
+
+        return self.positions.get(future, 0)
+
+    def pop(self) -> Optional[asyncio.Future]:
+        """
+        Remove the next command from the queue, the turn passes to the next
+        user
+        """
+        if not self.queues:
+            return None
+
+        priority = min(self.queues)
+        queue = self.queues[priority]
+        user_id, futures = next(iter(queue.items()))
+        future = futures.popleft()
+        if futures:
+            queue.move_to_end(user_id)
+        else:
+            del queue[user_id]
+            if not queue:
+                del self.queues[priority]
+
+        self.positions = None
+        return future
+
+    def wait_advance(self):
+        """
+        Get a future that is done the next time the queue advances
+        """
+        if self.advanced is None or self.advanced.done():
+            self.advanced = asyncio.get_running_loop().create_future()
+
+        return self.advanced
+
+    def release(self):
+        """
+        Free the slot of a command that has finished, giving it to the next
+        queued command
+        """
+        self.running -= 1
+        while self.running < self.limit:
+            future = self.pop()
+            if future is None:
+                break
+
+            if not future.done():
+                # the slot is taken for the command before it wakes up
+                self.running += 1
+                future.set_result(None)
+
+        if self.advanced is not None and not self.advanced.done():
+            self.advanced.set_result(None)
+
+
+cost_classes = {
+    name: CostClass(name, limit) for name, limit in common.COMMAND_COST_LIMITS.items()
+}
+buckets: dict[int, TokenBucket] = {}
+
+
+def get_bucket(user_id: int):
+    """
+    Get the token bucket of a user
+    """
+    bucket = buckets.get(user_id)
+    if bucket is None:
+        if len(buckets) > 1000:
+            # full buckets are the same as new ones, so they can be dropped
+            for key in [key for key, val in buckets.items() if val.is_full()]:
+                del buckets[key]
+
+        bucket = TokenBucket(common.COMMAND_RATE_BURST, common.COMMAND_RATE_INTERVAL)
+        buckets[user_id] = bucket
+
+    return bucket
+
+
+async def show_status(response_msg: discord.Message, status: str):
+    """
+    Show the status of a command that is waiting in its "Loading..." message
+    """
+    try:
+        await embed_utils.replace(
+            response_msg,
+            title="Your command is being processed:",
+            fields=(("\u2800", f"`{status}`", False),),
+        )
+    except discord.HTTPException:
+        pass
+
+
+async def admit(cmd: BaseCommand, is_admin: bool) -> Optional[CostClass]:
+    """
+    Wait until a command is admitted, returns the cost class in which a slot
+    was taken for it, or None if the command was not admitted
+    """
+    if not is_admin:
+        wait = get_bucket(cmd.author.id).take(common.COMMAND_RATE_MAX_WAIT)
+        if wait is None:
+            await embed_utils.replace(
+                cmd.response_msg,
+                title="Slow down!",
+                description=(
+                    "You are running commands too fast, please wait a bit "
+                    "before running more"
+                ),
+                color=0xFF0000,
+            )
+            return None
+
+        if wait:
+            await show_status(cmd.response_msg, f"Waiting for {wait:.1f} seconds...")
+            await asyncio.sleep(wait)
+
+    cost_class = cost_classes[cmd.get_cost_class()]
+    if cost_class.try_acquire():
+        return cost_class
+
+    future = cost_class.enqueue(
+        ADMIN_PRIORITY if is_admin else USER_PRIORITY, cmd.author.id
+    )
+    try:
+        shown_position = 0
+        while not future.done():
+            position = cost_class.position(future)
+            if position != shown_position:
+                # the queue can advance while the status is being shown,
+                # so the position is checked again afterwards
+                shown_position = position
+                await show_status(cmd.response_msg, f"Queued at position {position}...")
+                continue
+
+            await asyncio.wait(
+                (future, cost_class.wait_advance()),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+    except asyncio.CancelledError:
+        if not future.done():
+            cost_class.cancel(future)
+        elif not future.cancelled():
+            # a slot was taken for this command already
+            cost_class.release()
+        raise
+
+    await show_status(cmd.response_msg, "Loading...")
+    return cost_class
+
+
+async def run(cmd: BaseCommand, is_admin: bool):
+    """
+    Admit a command, and run it once it is admitted. When the command refreshes
+    another command (pg!refresh), that one is admitted and run after it
+    """
+    while True:
+        cost_class = await admit(cmd, is_admin)
+        if cost_class is None:
+            return
+
+        cmd.rerun = False
+        try:
+            await cmd.handle_cmd()
+        finally:
+            cost_class.release()
+
+        if not cmd.rerun:
+            return
@@ -8,7 +8,6 @@ This file defines the command handler class for the user commands of the bot
 
 from __future__ import annotations
 
-import copy
 import datetime
 import io
 import os
@@ -25,6 +24,7 @@ from pgbot.commands.base import (
     CodeBlock,
     String,
     add_group,
+    cost_class,
     no_dm,
 )
 from pgbot.commands.utils import sandbox
@@ -83,28 +83,26 @@ class UserCommand(FunCommand, HelpCommand):
         on -= datetime.timedelta(microseconds=on.microsecond)
 
         async with db.DiscordDB("reminders") as db_obj:
-            db_data = db_obj.get({})
-            if self.author.id not in db_data:
-                db_data[self.author.id] = {}
+            reminders = db_obj.get_key(self.author.id, {})
 
             # user is editing old reminder message, discard the old reminder
-            for key, (_, chan_id, msg_id) in tuple(db_data[self.author.id].items()):
+            for key, (_, chan_id, msg_id) in tuple(reminders.items()):
                 if chan_id == self.channel.id and msg_id == self.invoke_msg.id:
-                    db_data[self.author.id].pop(key)
+                    reminders.pop(key)
 
             limit = 25 if self.is_priv else 10
-            if len(db_data[self.author.id]) >= limit:
+            if len(reminders) >= limit:
                 raise BotException(
                     "Failed to set reminder!",
                     f"I cannot set more than {limit} reminders for you",
                 )
 
-            db_data[self.author.id][on] = (
+            reminders[on] = (
                 msg.string.strip(),
                 self.channel.id,
                 self.invoke_msg.id,
             )
-            db_obj.write(db_data)
+            db_obj.set_key(self.author.id, reminders)
 
         await embed_utils.replace(
             self.response_msg,
@@ -199,8 +197,8 @@ class UserCommand(FunCommand, HelpCommand):
         -----
         Implement pg!reminders, for users to view their reminders
         """
-        async with db.DiscordDB("reminders") as db_obj:
-            db_data = db_obj.get({})
+        async with db.DiscordDB("reminders", readonly=True) as db_obj:
+            db_data = db_obj.snapshot({})
 
         desc = "You have no reminders set"
         if self.author.id in db_data:
@@ -239,33 +237,30 @@ class UserCommand(FunCommand, HelpCommand):
         Implement pg!reminders_remove, for users to remove their reminders
         """
         async with db.DiscordDB("reminders") as db_obj:
-            db_data = db_obj.get({})
-            db_data_copy = copy.deepcopy(db_data)
+            reminders = db_obj.get_key(self.author.id, {})
+            reminders_copy = tuple(reminders)
             cnt = 0
             if reminder_ids:
                 for reminder_id in sorted(set(reminder_ids), reverse=True):
-                    if self.author.id in db_data:
-                        for i, dt in enumerate(db_data_copy[self.author.id]):
-                            if i == reminder_id:
-                                db_data[self.author.id].pop(dt)
-                                cnt += 1
-                                break
-                    if (
-                        reminder_id >= len(db_data_copy[self.author.id])
-                        or reminder_id < 0
-                    ):
+                    for i, dt in enumerate(reminders_copy):
+                        if i == reminder_id:
+                            reminders.pop(dt)
+                            cnt += 1
+                            break
+                    if reminder_id >= len(reminders_copy) or reminder_id < 0:
                         raise BotException(
                             "Invalid Reminder ID!",
                             "Reminder ID was not an existing reminder ID",
                         )
 
-                if self.author.id in db_data and not db_data[self.author.id]:
-                    db_data.pop(self.author.id)
-
-            elif self.author.id in db_data:
-                cnt = len(db_data.pop(self.author.id))
+                if reminders:
+                    db_obj.set_key(self.author.id, reminders)
+                else:
+                    db_obj.delete_key(self.author.id)
 
-            db_obj.write(db_data)
+            else:
+                cnt = len(reminders)
+                db_obj.delete_key(self.author.id)
 
         await embed_utils.replace(
             self.response_msg,
@@ -273,6 +268,7 @@ class UserCommand(FunCommand, HelpCommand):
             description=f"Successfully removed {cnt} reminder(s)",
         )
 
+    @cost_class("sandbox")
     async def cmd_exec(self, code: CodeBlock):
         """
         ->type Play With Me :snake:
@@ -410,11 +406,13 @@ class UserCommand(FunCommand, HelpCommand):
         except discord.errors.NotFound:
             pass
 
-        # Handle the new command, the one that pg!refresh is trying to refresh
+        # Handle the new command, the one that pg!refresh is trying to refresh.
+        # It is run by the scheduler after this one, so that it is admitted
+        # like any other command
         self.response_msg = msg
         self.cmd_str = cmd_str
         self.page = int(page) - 1
-        await self.handle_cmd()
+        self.rerun = True
 
     @no_dm
     @add_group("poll")
@@ -640,8 +638,8 @@ class UserCommand(FunCommand, HelpCommand):
         ->description Show the ping-stream-list
         Send an embed with all the users currently in the ping-stream-list
         """
-        async with db.DiscordDB("stream") as db_obj:
-            data = db_obj.get([])
+        async with db.DiscordDB("stream", readonly=True) as db_obj:
+            data = db_obj.snapshot([])
 
         if not data:
             await embed_utils.replace(
@@ -730,8 +728,8 @@ class UserCommand(FunCommand, HelpCommand):
         The streamer name will be included and many people will be pinged so \
         don't make pranks with this command.
         """
-        async with db.DiscordDB("stream") as ping_db:
-            data: list = ping_db.get([])
+        async with db.DiscordDB("stream", readonly=True) as ping_db:
+            data: list = ping_db.snapshot([])
 
         msg = message.string if message else "Enjoy the stream!"
         ping = (
@@ -16,7 +16,7 @@ import discord
 import pygame
 import unidecode
 
-from pgbot import common, db, emotion
+from pgbot import common, emotion
 from pgbot.commands.base import (
     BaseCommand,
     BotException,
@@ -160,7 +160,7 @@ class FunCommand(BaseCommand):
         -----
         Implement pg!pet, to pet the bot
         """
-        fname = "die.gif" if await emotion.get("anger") > 60 else "pet.gif"
+        fname = "die.gif" if emotion.get("anger") > 60 else "pet.gif"
         await embed_utils.replace(
             self.response_msg,
             color=embed_utils.DEFAULT_EMBED_COLOR,
@@ -168,7 +168,7 @@ class FunCommand(BaseCommand):
             + f"PygameCommunityBot/main/assets/images/{fname}",
         )
 
-        await emotion.update("happy", random.randint(10, 15))
+        emotion.update("happy", random.randint(10, 15))
 
     async def cmd_vibecheck(self):
         """
@@ -178,8 +178,7 @@ class FunCommand(BaseCommand):
         -----
         Implement pg!vibecheck, to check the snek's emotion
         """
-        async with db.DiscordDB("emotions") as db_obj:
-            all_emotions = db_obj.get({})
+        all_emotions = emotion.get_all()
 
         emotion_percentage = vibecheck.get_emotion_percentage(all_emotions, round_by=-1)
         all_emotion_response = vibecheck.get_emotion_desc_dict(all_emotions)
@@ -231,7 +230,7 @@ class FunCommand(BaseCommand):
         -----
         Implement pg!sorry, to ask forgiveness from the bot after bonccing it
         """
-        anger = await emotion.get("anger")
+        anger = emotion.get("anger")
         if not anger:
             await embed_utils.replace(
                 self.response_msg,
@@ -248,7 +247,7 @@ class FunCommand(BaseCommand):
                 description="Your pythonic lord accepts your apology.\n"
                 + f"Now go to code again.\nAnger level is {max(anger - num, 0)}",
             )
-            await emotion.update("anger", -num)
+            emotion.update("anger", -num)
         else:
             await embed_utils.replace(
                 self.response_msg,
@@ -17,9 +17,9 @@ import discord
 import pygame
 
 from pgbot import common, db
-from pgbot.commands.base import BaseCommand, BotException, String, no_dm
+from pgbot.commands.base import BaseCommand, BotException, String, cost_class, no_dm
 from pgbot.commands.utils import clock, docs, help
-from pgbot.utils import utils, embed_utils
+from pgbot.utils import cmd_logs, utils, embed_utils
 
 
 class HelpCommand(BaseCommand):
@@ -102,6 +102,7 @@ class HelpCommand(BaseCommand):
                 color=0x228B22,
             )
 
+    @cost_class("heavy")
     async def cmd_clock(
         self,
         action: str = "",
@@ -125,12 +126,11 @@ class HelpCommand(BaseCommand):
         -----
         Implement pg!clock, to display a clock of helpfulies/mods/wizards
         """
-        async with db.DiscordDB("clock") as db_obj:
-            timezones = db_obj.get({})
+        async with db.DiscordDB("clock", readonly=not action) as db_obj:
             if action:
                 if _member is None:
                     member = self.author
-                    if member.id not in timezones:
+                    if db_obj.get_key(member.id) is None:
                         raise BotException(
                             "Cannot update clock!",
                             "You cannot run clock update commands because you are "
@@ -145,25 +145,23 @@ class HelpCommand(BaseCommand):
                             "Failed to update clock!", "Timezone offset out of range"
                         )
 
-                    if member.id in timezones:
-                        timezones[member.id][0] = timezone
+                    timezone_data = db_obj.get_key(member.id)
+                    if timezone_data is not None:
+                        timezone_data[0] = timezone
                         if color is not None:
-                            timezones[member.id][1] = utils.color_to_rgb_int(color)
+                            timezone_data[1] = utils.color_to_rgb_int(color)
                     else:
                         if color is None:
                             raise BotException(
                                 "Failed to update clock!",
                                 "Color argument is required when adding new people",
                             )
-                        timezones[member.id] = [timezone, utils.color_to_rgb_int(color)]
+                        timezone_data = [timezone, utils.color_to_rgb_int(color)]
 
-                    # sort timezones dict after an update operation
-                    timezones = dict(sorted(timezones.items(), key=lambda x: x[1][0]))
+                    db_obj.set_key(member.id, timezone_data)
 
                 elif action == "remove":
-                    try:
-                        timezones.pop(member.id)
-                    except KeyError:
+                    if not db_obj.delete_key(member.id):
                         raise BotException(
                             "Failed to update clock!",
                             "Cannot remove non-existing person from clock",
@@ -174,16 +172,15 @@ class HelpCommand(BaseCommand):
                         "Failed to update clock!", f"Invalid action specifier {action}"
                     )
 
-                db_obj.write(timezones)
+            timezones = db_obj.snapshot({})
 
         t = time.time()
 
         pygame.image.save(
             await clock.user_clock(t, timezones, self.get_guild()), f"temp{t}.png"
         )
-        common.cmd_logs[self.invoke_msg.id] = await self.channel.send(
-            file=discord.File(f"temp{t}.png")
-        )
+        clock_msg = await self.channel.send(file=discord.File(f"temp{t}.png"))
+        cmd_logs.add(self.invoke_msg.id, clock_msg.id)
         os.remove(f"temp{t}.png")
 
         try:
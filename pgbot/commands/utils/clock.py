@@ -127,7 +127,8 @@ async def user_clock(t: float, clock_timezones: dict, guild: discord.Guild):
 
     tx = ty = 0
     tz_and_col = {}
-    for mem, (offset, color) in clock_timezones.items():
+    # display people sorted by their timezones
+    for mem, (offset, color) in sorted(clock_timezones.items(), key=lambda x: x[1][0]):
         mem = await guild.fetch_member(mem)
         # try to use nickname, if it is too long, fallback to name
         # 14 happens to be the sweet spot, any longer and the name overflows
@@ -143,8 +143,7 @@ async def send_help_message(
 
     elif commands[0] in cmds_and_funcs:
         func_name = commands[0]
-        funcs = groups[func_name] if func_name in groups else []
-        funcs.insert(0, cmds_and_funcs[func_name])
+        funcs = [cmds_and_funcs[func_name], *groups.get(func_name, ())]
 
         for func in funcs:
             if (
@@ -6,18 +6,23 @@ Copyright (c) 2020-present PygameCommunityDiscord
 This file defines exec sandbox utitites, for sandboxing and running user code.
 """
 
+from __future__ import annotations
 
 import asyncio
 import builtins
 import cmath
+import collections
 import itertools
 import math
 import multiprocessing
+import os
 import random
 import re
 import string
 import time
 from inspect import getframeinfo, stack
+from multiprocessing.connection import Connection
+from typing import Optional
 
 
 import psutil
@@ -227,17 +232,12 @@ for const in pygame.constants.__all__:
     setattr(FilteredPygame, const, pygame.constants.__dict__[const])
 
 
-def pg_exec(code: str, tstamp: int, allowed_builtins: dict, q: multiprocessing.Queue):
+def get_sandbox_globals(allowed_builtins: dict):
     """
-    exec wrapper used for pg!exec, runs in a seperate process. Since this
-    function runs in a seperate Process, keep that in mind if you want to make
-    any changes to this function (that is, do not touch this shit if you don't
-    know what you are doing)
+    Get the globals that pg!exec code runs with, except for the ones that are
+    made again for every run. This runs once in every sandbox worker process
     """
-    sandbox_funcs = SandboxFunctionsObject()
-    output = sandbox_funcs.output
-
-    allowed_globals = {
+    sandbox_globals = {
         "math": math,
         "cmath": cmath,
         "random": random,
@@ -247,14 +247,28 @@ def pg_exec(code: str, tstamp: int, allowed_builtins: dict, q: multiprocessing.Q
         "itertools": itertools,
     }
 
-    for module in allowed_globals:
-        del allowed_globals[module].__loader__, allowed_globals[module].__spec__
+    for module in sandbox_globals:
+        del sandbox_globals[module].__loader__, sandbox_globals[module].__spec__
 
-    allowed_globals["__builtins__"] = allowed_builtins
-    allowed_globals["pygame"] = FilteredPygame
-    allowed_globals["output"] = output
+    sandbox_globals["__builtins__"] = allowed_builtins
+    sandbox_globals["pygame"] = FilteredPygame
+
+    sandbox_globals.update(allowed_builtins)
+    return sandbox_globals
+
+
+def pg_exec(code: str, tstamp: int, sandbox_globals: dict):
+    """
+    exec wrapper used for pg!exec, runs in a sandbox worker process. Since this
+    function runs in a seperate Process, keep that in mind if you want to make
+    any changes to this function (that is, do not touch this shit if you don't
+    know what you are doing)
+    """
+    sandbox_funcs = SandboxFunctionsObject()
+    output = sandbox_funcs.output
 
-    allowed_globals.update(allowed_builtins)
+    allowed_globals = dict(sandbox_globals)
+    allowed_globals["output"] = output
 
     for func_name in sandbox_funcs.public_functions:
         allowed_globals[func_name] = getattr(sandbox_funcs, func_name)
@@ -262,8 +276,7 @@ def pg_exec(code: str, tstamp: int, allowed_builtins: dict, q: multiprocessing.Q
     for ill_attr in common.ILLEGAL_ATTRIBUTES:
         if ill_attr in code:
             output.exc = "Suspicious Pattern"
-            q.put(output)
-            return
+            return output
 
     script_start = time.perf_counter()
     try:
@@ -327,47 +340,239 @@ def pg_exec(code: str, tstamp: int, allowed_builtins: dict, q: multiprocessing.Q
                     img.save(**kwargs)
                     sanitized_output._imgs = True
 
-    q.put(sanitized_output)
+    return sanitized_output
 
 
-async def exec_sandbox(
-    code: str, tstamp: int, timeout: int = 5, max_memory: int = 2 ** 28
-):
+def sandbox_worker(conn: Connection, allowed_builtins: dict):
     """
-    Helper to run pg!exec code in a sandbox, manages the seperate process that
-    runs to execute user code.
+    Main function of a sandbox worker process. It sets up everything that
+    pg!exec code needs before any code is sent to it, and then runs the code
+    it receives, replying with the output and whether the memory of the
+    process has grown by more than SANDBOX_WORKER_MAX_GROWTH bytes since it
+    was set up
     """
-    q = multiprocessing.Queue(1)
-    proc = multiprocessing.Process(
-        target=pg_exec,
-        args=(code, tstamp, filtered_builtins, q),
-        daemon=True,  # the process must die when the main process dies
-    )
-    proc.start()
-    psproc = psutil.Process(proc.pid)
-
-    # is system-wide and has the highest resolution.
-    start = time.perf_counter()
-    while proc.is_alive():
-        if start + timeout < time.perf_counter():
-            proc.kill()
-            output = Output()
-            output.exc = f"Hit timeout of {timeout} seconds!"
-            output.duration = time.perf_counter() - start
-            return output
-
+    if mp_context.get_start_method() == "forkserver":
+        # close what the worker inherited from the fork server, it only needs
+        # the standard streams and its connection to the bot
+        os.closerange(3, conn.fileno())
+        os.closerange(conn.fileno() + 1, os.sysconf("SC_OPEN_MAX"))
+
+    # workers do not inherit the pygame setup of the bot, as they are not
+    # forked from it
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    pygame.init()  # pylint: disable=no-member
+    pygame.display.set_mode((1, 1))
+
+    sandbox_globals = get_sandbox_globals(allowed_builtins)
+    Image.init()  # load the PIL plugins that saving images needs
+    pg_exec("", 0, sandbox_globals)  # the first run allocates a bit more
+
+    psproc = psutil.Process()
+    max_memory = psproc.memory_info().rss + common.SANDBOX_WORKER_MAX_GROWTH
+    while True:
         try:
-            if psproc.memory_info().rss > max_memory:
-                proc.kill()
+            code, tstamp = conn.recv()
+        except EOFError:
+            # the bot closed the connection, this worker is not needed anymore
+            return
+
+        output = pg_exec(code, tstamp, sandbox_globals)
+        conn.send((output, psproc.memory_info().rss > max_memory))
+
+
+# Workers are forked from a server process that imports this module once,
+# instead of from the bot. Forking the bot would copy the locks held by its
+# other threads, and the workers would inherit the open files and sockets of
+# the bot. Where there is no fork server, workers are spawned from scratch
+mp_context = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+mp_context.set_forkserver_preload([__name__])
+
+
+class SandboxWorker:
+    """
+    A process that runs pg!exec code. Workers are started ahead of time, so
+    that they are set up by the time code is sent to them
+    """
+
+    def __init__(self):
+        self.conn, child_conn = mp_context.Pipe()
+        self.proc = mp_context.Process(
+            target=sandbox_worker,
+            args=(child_conn, filtered_builtins),
+            daemon=True,  # the process must die when the main process dies
+        )
+        self.proc.start()
+        child_conn.close()
+
+        self.psproc = psutil.Process(self.proc.pid)
+        self.runs = 0
+        self.reusable = True
+
+    async def run(self, code: str, tstamp: int, timeout: int, max_memory: int):
+        """
+        Run pg!exec code in this worker, and get its output. The worker is
+        only reusable afterwards if the code ran to the end
+        """
+        self.reusable = False
+        self.runs += 1
+        self.conn.send((code, tstamp))
+
+        # is system-wide and has the highest resolution.
+        start = time.perf_counter()
+        while not self.conn.poll():
+            if start + timeout < time.perf_counter():
                 output = Output()
-                output.exc = f"The bot's memory has taken up to {max_memory} bytes!"
+                output.exc = f"Hit timeout of {timeout} seconds!"
                 output.duration = time.perf_counter() - start
                 return output
-        except psutil.NoSuchProcess:
-            # The process finished but it tried to check it's memory usage
-            # at the "wrong time". Get the output from the queue and return it
-            return q.get()
 
-        await asyncio.sleep(0.05)  # Let the bot do other async things
+            try:
+                if self.psproc.memory_info().rss > max_memory:
+                    output = Output()
+                    output.exc = f"The bot's memory has taken up to {max_memory} bytes!"
+                    output.duration = time.perf_counter() - start
+                    return output
+            except psutil.NoSuchProcess:
+                # The process finished but it tried to check it's memory usage
+                # at the "wrong time". Get the output from the pipe
+                break
+
+            await asyncio.sleep(common.SANDBOX_POLL_INTERVAL)
+
+        try:
+            output, memory_grown = self.conn.recv()
+        except EOFError:
+            # the code killed the process without sending any output
+            output = Output()
+            output.exc = "The code crashed the sandbox!"
+            output.duration = time.perf_counter() - start
+            return output
+
+        self.reusable = self.runs < common.SANDBOX_WORKER_MAX_RUNS and not memory_grown
+        return output
+
+    def close(self):
+        """
+        Stop this worker, killing it if it is running code
+        """
+        self.conn.close()
+        if self.proc.is_alive():
+            self.proc.kill()
+
+
+# workers that are set up and wait for code to run
+idle_workers: collections.deque[SandboxWorker] = collections.deque()
+
+# the task that starts workers in the background, when the pool is not full
+refill_task: Optional[asyncio.Task] = None
+
+
+async def start_worker():
+    """
+    Start a worker in a thread, so that waiting for the fork server does not
+    block the event loop
+    """
+    future = asyncio.get_running_loop().run_in_executor(None, SandboxWorker)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        # the thread still starts the worker, which must not be left running
+        future.add_done_callback(close_started_worker)
+        raise
+
+
+def close_started_worker(future: asyncio.Future):
+    """
+    Close a worker that was started for a caller that does not wait anymore
+    """
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+async def refill_pool():
+    """
+    Start workers one at a time until there are enough idle ones, workers can
+    be taken from the pool while this runs
+    """
+    while len(idle_workers) < common.SANDBOX_POOL_SIZE:
+        worker = await start_worker()
+        if len(idle_workers) < common.SANDBOX_POOL_SIZE:
+            idle_workers.append(worker)
+        else:
+            # used workers were put back while this one was starting
+            worker.close()
+
+
+def fill_pool():
+    """
+    Start workers in the background until there are enough idle ones. This
+    never waits, and only one refill runs at a time
+    """
+    global refill_task
+
+    if len(idle_workers) < common.SANDBOX_POOL_SIZE and (
+        refill_task is None or refill_task.done()
+    ):
+        refill_task = asyncio.create_task(refill_pool())
+
+
+async def get_worker():
+    """
+    Take an idle worker from the pool, or start a new one if there is none
+    """
+    while idle_workers:
+        worker = idle_workers.popleft()
+        if worker.proc.is_alive():
+            return worker
+
+        worker.close()
+
+    return await start_worker()
+
+
+def init():
+    """
+    Start the fork server and the pool of sandbox workers. The pool is filled
+    before this returns, so that the first commands do not have to wait for it
+    """
+    while len(idle_workers) < common.SANDBOX_POOL_SIZE:
+        idle_workers.append(SandboxWorker())
+
+
+def quit():
+    """
+    Stop the pool of sandbox workers
+    """
+    if refill_task is not None:
+        # a worker that is still being started is closed once it is up
+        refill_task.cancel()
+
+    while idle_workers:
+        idle_workers.popleft().close()
+
+
+async def exec_sandbox(
+    code: str, tstamp: int, timeout: int = 5, max_memory: int = 2 ** 28
+):
+    """
+    Helper to run pg!exec code in a sandbox, runs the code in a worker from
+    the pool of sandbox workers. Workers are used for at most
+    SANDBOX_WORKER_MAX_RUNS runs, and not reused after their memory has grown
+    or they had to be killed
+    """
+    worker = await get_worker()
+    if worker.runs + 1 >= common.SANDBOX_WORKER_MAX_RUNS:
+        # the worker will be replaced, start its replacement while the code runs
+        fill_pool()
+
+    try:
+        return await worker.run(code, tstamp, timeout, max_memory)
+    finally:
+        if worker.reusable and len(idle_workers) < common.SANDBOX_POOL_SIZE:
+            idle_workers.appendleft(worker)
+        else:
+            worker.close()
 
-    return q.get()
+        fill_pool()
@@ -8,6 +8,7 @@ This file defines some constants and variables used across the whole codebase
 
 import io
 import os
+import tempfile
 from typing import Optional, Union
 
 import discord
@@ -27,8 +28,6 @@ ints.members = True  # needed for on_member_join
 bot = discord.Client(intents=ints)
 window = pygame.Surface((1, 1))  # This will later be redefined
 
-cmd_logs = {}
-
 # pygame community guild, or whichever is the 'primary' guild for the bot
 guild: Optional[discord.Guild] = None
 
@@ -68,12 +67,104 @@ TEST_USER_IDS = (
 if TEST_USER_ID is not None:
     TEST_USER_IDS.add(TEST_USER_ID)
 
+# Path to a local SQLite file to store the DB in. If this is not set, the DB is
+# stored in the DB channel
+DB_PATH = os.environ.get("DB_PATH")
+
+# Path to the local journal file, that records every DB change between flushes
+# so that they can be recovered after a crash. It is kept next to the SQLite
+# file by default, or in the temporary directory when the DB is stored in the
+# DB channel. Set it to an empty string to disable the journal
+DB_JOURNAL_PATH = os.environ.get(
+    "DB_JOURNAL_PATH",
+    (
+        os.path.join(tempfile.gettempdir(), "pgbot_db.journal")
+        if DB_PATH is None
+        else f"{DB_PATH}.journal"
+    ),
+)
+
 
 PREFIX = "pd!" if TEST_MODE else "pg!"
 CMD_FUNC_PREFIX = "cmd_"
 
 BASIC_MAX_FILE_SIZE = 8_000_000  # bytes
 
+# Changed DB tables are flushed to the DB channel every DB_FLUSH_INTERVAL
+# seconds, or right away once DB_FLUSH_THRESHOLD tables have changed
+DB_FLUSH_INTERVAL = 120  # seconds
+DB_FLUSH_THRESHOLD = 5
+
+# After a flush fails, tables are not flushed right away again for
+# DB_FLUSH_RETRY_DELAY seconds. The delay doubles with every failed flush in a
+# row, up to DB_FLUSH_INTERVAL
+DB_FLUSH_RETRY_DELAY = 5  # seconds
+
+# Changes to the DB are written to the journal file in batches, every
+# DB_JOURNAL_SYNC_INTERVAL seconds
+DB_JOURNAL_SYNC_INTERVAL = 1  # seconds
+
+# Maximum number of DB chunks downloaded at once when the bot boots up
+DB_LOAD_CONCURRENCY = 8
+
+# DB tables are compressed with this codec ("none", "zlib" or "lzma"), and split
+# into chunks of at most DB_CHUNK_SIZE bytes in the DB channel
+DB_BLOB_CODEC = "zlib"
+DB_CHUNK_SIZE = BASIC_MAX_FILE_SIZE
+
+# DB tables are serialized with pickle ("pickle"), or with the typed serializer
+# ("typed"), which is slower but never runs code when loading.
+# DB_TABLE_SERIALIZERS overrides the serializer of single tables. Tables that
+# hold types that the typed serializer cannot handle fall back to pickle, and
+# both formats are recognised when loading
+DB_SERIALIZER = "pickle"
+DB_TABLE_SERIALIZERS: dict[str, str] = {}
+
+# The emotions of the bot are saved to the DB at most every
+# EMOTION_SAVE_INTERVAL seconds
+EMOTION_SAVE_INTERVAL = 30  # seconds
+
+# Maximum number of recently seen messages that are kept in memory, so that
+# message arguments of commands can be resolved without API calls
+MESSAGE_CACHE_SIZE = 1000
+
+# Maximum number of recent commands whose response messages are remembered, so
+# that the commands can be run again in them when they are edited
+CMD_LOGS_SIZE = 100
+
+# Commands are admitted by the command scheduler. Every user can run a burst of
+# COMMAND_RATE_BURST commands, and then one every COMMAND_RATE_INTERVAL
+# seconds. Commands that would wait longer than COMMAND_RATE_MAX_WAIT seconds
+# for their turn are rejected. Admins are not limited
+COMMAND_RATE_BURST = 5
+COMMAND_RATE_INTERVAL = 4  # seconds
+COMMAND_RATE_MAX_WAIT = 20  # seconds
+
+# Maximum number of commands of every cost class that run at once, the others
+# wait in a queue
+COMMAND_COST_LIMITS = {"light": 16, "heavy": 3, "sandbox": 2}
+
+# Commands are logged in the background, every COMMAND_LOG_INTERVAL seconds.
+# At most COMMAND_LOG_QUEUE_SIZE commands wait to be logged as embeds, the
+# next COMMAND_LOG_DIGEST_SIZE are logged in a text file, and the rest are
+# only counted
+COMMAND_LOG_INTERVAL = 5
+COMMAND_LOG_QUEUE_SIZE = 100
+COMMAND_LOG_DIGEST_SIZE = 1000
+
+# pg!exec code runs in a pool of sandbox worker processes, that are started
+# ahead of time. SANDBOX_POOL_SIZE workers are kept ready, and a worker runs
+# at most SANDBOX_WORKER_MAX_RUNS pieces of code before it is replaced. Code
+# that runs in a reused worker can see what the code before it left behind,
+# so workers are not reused by default. Workers are also replaced once their
+# memory grows by more than SANDBOX_WORKER_MAX_GROWTH bytes, which leaves room
+# for the few pages that the allocator keeps between runs. Running workers
+# are checked every SANDBOX_POLL_INTERVAL seconds
+SANDBOX_POOL_SIZE = 2
+SANDBOX_WORKER_MAX_RUNS = 1
+SANDBOX_WORKER_MAX_GROWTH = 2**20
+SANDBOX_POLL_INTERVAL = 0.01
+
 ESC_BACKTICK_3X = "\u200b`\u200b`\u200b`\u200b"  # U+200B
 ZERO_SPACE = "\u200b"  # U+200B
 
@@ -7,43 +7,931 @@ This file defines some important utility Classes/functions for Discord Database
 """
 
 import asyncio
+import collections
 import io
+import lzma
+import os
 import pickle
+import sqlite3
+import struct
+import time
+import zlib
+from typing import Any, BinaryIO, Callable, Optional
 
 import discord
+from discord.ext import tasks
 
-from pgbot import common
+from pgbot import common, serializer
+from pgbot.utils.stats import Histogram
 
-# Store "name: pickled data" pairs as cache. Do not store unpickled data
-db_obj_cache: dict[str, bytes] = {}
+
+class DBBackend:
+    """
+    Base class for the storage backends of the DB. A backend only deals with
+    the encoded data (blobs) of the tables, all the caching is done by the DB
+    module
+    """
+
+    # whether the backend keeps data across restarts. Changes to the DB are
+    # only journaled for persistent backends
+    persistent = True
+
+    async def load(self) -> dict[str, bytes]:
+        """
+        Load the blobs of all the tables stored in the backend
+        """
+        raise NotImplementedError()
+
+    async def store(self, name: str, blob: bytes):
+        """
+        Store the blob of a table, replacing the older blob of it
+        """
+        raise NotImplementedError()
+
+    async def remove(self, name: str):
+        """
+        Remove a table from the backend
+        """
+        raise NotImplementedError()
+
+    async def close(self):
+        """
+        Clean up the backend, called after the last flush
+        """
+
+
+class MemoryBackend(DBBackend):
+    """
+    A backend that only keeps data in memory, and hence does not persist
+    anything across restarts. Useful for testing
+    """
+
+    persistent = False
+
+    def __init__(self):
+        self.blobs: dict[str, bytes] = {}
+
+    async def load(self):
+        return dict(self.blobs)
+
+    async def store(self, name: str, blob: bytes):
+        self.blobs[name] = blob
+
+    async def remove(self, name: str):
+        self.blobs.pop(name, None)
+
+
+class DiscordBackend(DBBackend):
+    """
+    A backend that stores every table as file attachments on messages in a
+    discord channel, where the message content is the table name. Big tables
+    are split into chunks, that are spread over many attachments and messages
+    """
+
+    def __init__(self, channel: discord.TextChannel):
+        self.channel = channel
+
+        # store per-db IDs of the messages in the channel that hold the table
+        # data. These get deleted once a newer version of the table is sent
+        self.msg_ids: dict[str, list[int]] = {}
+
+    @staticmethod
+    def _parse_filename(filename: str):
+        """
+        Parse the filename of a chunk attachment into a tuple of generation,
+        chunk index, chunk count and CRC32 of the chunk. Returns None if the
+        attachment is not a chunk, but a whole table from before tables were
+        chunked
+        """
+        if not filename.endswith(".pgdb"):
+            return None
+
+        try:
+            gen, index, count, crc = filename[:-5].split("-")
+            return gen, int(index), int(count), int(crc, base=16)
+        except ValueError:
+            return None
+
+    async def load(self):
+        # maps table names to the generations of the table (the chunks that
+        # were stored together), from newest to oldest. Every generation is a
+        # tuple of chunk count and a dict of chunk indices to their attachment
+        # and checksum
+        generations: dict[
+            str, dict[str, tuple[int, dict[int, tuple[discord.Attachment, int]]]]
+        ] = {}
+
+        # history is from newest to oldest. Older messages of a table are
+        # deleted the next time the table is stored
+        async for msg in self.channel.history(limit=None):
+            if not msg.attachments:
+                continue
+
+            gens = generations.setdefault(msg.content, {})
+            self.msg_ids.setdefault(msg.content, []).append(msg.id)
+            for attachment in msg.attachments:
+                parsed = self._parse_filename(attachment.filename)
+                if parsed is None:
+                    gens[f"{msg.id}"] = (1, {0: (attachment, None)})
+                    continue
+
+                gen, index, count, crc = parsed
+                gens.setdefault(gen, (count, {}))[1][index] = (attachment, crc)
+
+        semaphore = asyncio.Semaphore(common.DB_LOAD_CONCURRENCY)
+
+        async def read_chunk(attachment: discord.Attachment, crc: Optional[int]):
+            async with semaphore:
+                chunk = await attachment.read()
+
+            if crc is not None and zlib.crc32(chunk) != crc:
+                raise ValueError(f"Checksum mismatch in '{attachment.filename}'")
+            return chunk
+
+        async def read(name: str):
+            start = time.perf_counter()
+            for count, chunks in generations[name].values():
+                if len(chunks) != count:
+                    # sending the table got interrupted, use an older one
+                    continue
+
+                try:
+                    blob = b"".join(
+                        await asyncio.gather(
+                            *(read_chunk(*chunks[i]) for i in range(count))
+                        )
+                    )
+                except (ValueError, KeyError) as exc:
+                    print(f"Skipping corrupt copy of DB table '{name}':", exc)
+                    continue
+
+                print(
+                    f"Loaded DB table '{name}' ({len(blob)} bytes, {count} chunk(s))",
+                    f"in {(time.perf_counter() - start) * 1000:.2f} ms",
+                )
+                return name, blob
+
+            print(f"Could not find a complete copy of DB table '{name}'")
+            return name, None
+
+        return {
+            name: blob
+            for name, blob in await asyncio.gather(*map(read, generations))
+            if blob is not None
+        }
+
+    async def _delete_old(self, name: str, keep_ids: tuple[int, ...] = ()):
+        """
+        Delete the older messages of a table, except the messages to keep
+        """
+        old_ids = self.msg_ids.pop(name, [])
+        self.msg_ids[name] = list(keep_ids)
+        for msg_id in old_ids:
+            try:
+                await self.channel.get_partial_message(msg_id).delete()
+            except discord.NotFound:
+                pass
+            except discord.HTTPException:
+                # retry deleting it the next time this table is stored
+                self.msg_ids[name].append(msg_id)
+
+    async def store(self, name: str, blob: bytes):
+        size = common.DB_CHUNK_SIZE
+        chunks = [blob[i : i + size] for i in range(0, len(blob), size)] or [b""]
+
+        gen = f"{int(time.time() * 1000):x}"
+        files: list[list[discord.File]] = [[]]
+        files_size = 0
+        for i, chunk in enumerate(chunks):
+            # a message can have at most 10 attachments, and the attachments
+            # together cannot exceed the file size limit
+            if (
+                len(files[-1]) >= 10
+                or files_size + len(chunk) > common.BASIC_MAX_FILE_SIZE
+            ):
+                files.append([])
+                files_size = 0
+
+            files_size += len(chunk)
+            files[-1].append(
+                discord.File(
+                    io.BytesIO(chunk),
+                    filename=f"{gen}-{i}-{len(chunks)}-{zlib.crc32(chunk):08x}.pgdb",
+                )
+            )
+
+        # old messages are deleted only after all the new ones were sent, so
+        # that the table is never lost if sending fails
+        sent_ids = []
+        try:
+            for msg_files in files:
+                sent_ids.append((await self.channel.send(name, files=msg_files)).id)
+        except BaseException:
+            # the incomplete table that got sent is skipped when loading, and
+            # deleted along with the old messages next time
+            self.msg_ids.setdefault(name, []).extend(sent_ids)
+            raise
+
+        await self._delete_old(name, tuple(sent_ids))
+
+    async def remove(self, name: str):
+        await self._delete_old(name)
+
+
+class SQLiteBackend(DBBackend):
+    """
+    A backend that stores tables in a local SQLite database file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS tables (name TEXT PRIMARY KEY, data BLOB)"
+        )
+        self.conn.commit()
+
+    async def _run(self, query: str, *params: Any):
+        """
+        Run a query and commit it in a thread, so that disk IO does not block
+        the event loop
+        """
+
+        def run():
+            with self.conn:
+                return self.conn.execute(query, params).fetchall()
+
+        return await asyncio.get_running_loop().run_in_executor(None, run)
+
+    async def load(self):
+        return dict(await self._run("SELECT name, data FROM tables"))
+
+    async def store(self, name: str, blob: bytes):
+        await self._run("REPLACE INTO tables (name, data) VALUES (?, ?)", name, blob)
+
+    async def remove(self, name: str):
+        await self._run("DELETE FROM tables WHERE name = ?", name)
+
+    async def close(self):
+        self.conn.close()
+
+
+class RWLock:
+    """
+    A reader/writer lock for asyncio. Any number of readers can hold the lock
+    at the same time, while a writer holds it exclusively. The lock is handed
+    out in the order it was requested, so that readers and writers do not
+    starve each other
+    """
+
+    def __init__(self):
+        self._readers = 0
+        self._writer = False
+        self._waiters: collections.deque[tuple[asyncio.Future, bool]] = (
+            collections.deque()
+        )
+
+    def locked(self):
+        """
+        Returns whether the lock is held by anyone
+        """
+        return self._writer or self._readers > 0
+
+    def _can_grant(self, exclusive: bool):
+        return not self._writer and (not exclusive or not self._readers)
+
+    def _grant(self, exclusive: bool):
+        if exclusive:
+            self._writer = True
+        else:
+            self._readers += 1
+
+    def _wake_waiters(self):
+        """
+        Grant the lock to the waiters at the front of the queue, either one
+        writer, or all consecutive readers
+        """
+        while self._waiters:
+            fut, exclusive = self._waiters[0]
+            if fut.done():
+                # waiter got cancelled
+                self._waiters.popleft()
+                continue
+
+            if not self._can_grant(exclusive):
+                break
+
+            self._waiters.popleft()
+            self._grant(exclusive)
+            fut.set_result(None)
+            if exclusive:
+                break
+
+    async def acquire(self, exclusive: bool = True):
+        """
+        Acquire the lock, exclusively for writers, or shared for readers
+        """
+        if not self._waiters and self._can_grant(exclusive):
+            self._grant(exclusive)
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append((fut, exclusive))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # lock was granted, but the waiter got cancelled
+                self.release(exclusive)
+            else:
+                # this waiter may have blocked the ones behind it
+                self._wake_waiters()
+            raise
+
+    def release(self, exclusive: bool = True):
+        """
+        Release the lock that was acquired with the same exclusive flag
+        """
+        if exclusive:
+            self._writer = False
+        else:
+            self._readers -= 1
+
+        self._wake_waiters()
+
+
+class TableStats:
+    """
+    Usage statistics of a DB table, shown with the "db stats" command
+    """
+
+    def __init__(self):
+        self.reads = 0
+        self.snapshots = 0
+        self.writes = 0
+        self.flushes = 0
+        self.lock_wait = Histogram()
+        self.lock_hold = Histogram()
+        self.flush_time = Histogram()
+
+        # size of the pickled data and of the stored blob of the table, from
+        # the last time it was loaded or flushed
+        self.data_size = 0
+        self.blob_size = 0
+
+
+# Store per-db usage statistics
+db_stats: collections.defaultdict[str, TableStats] = collections.defaultdict(TableStats)
+
+
+# Store "name: object" pairs as cache. Objects that were handed out with
+# DiscordDB.snapshot are never mutated in place, writes replace them instead
+# (copy-on-write)
+db_obj_cache: dict[str, Any] = {}
+
+# Store the names of the tables whose objects in the cache were handed out
+# with DiscordDB.snapshot
+db_shared: set[str] = set()
+
+# Store per-db version counter, that gets bumped on every change
+db_versions: dict[str, int] = {}
+
+# Store "name: (version, pickled data)" pairs. Objects are only pickled lazily,
+# when a flush needs them or when a copy of them is requested
+db_blob_cache: dict[str, tuple[int, bytes]] = {}
+
+# Store "name: {key: pickled data}" pairs for tables that are dicts (keyed
+# tables). Keyed tables are pickled key by key, so that only the keys in
+# db_dirty_keys have to be pickled again. If the dirty keys of a table are None,
+# every key of it has to be pickled again
+db_key_blobs: dict[str, dict[Any, bytes]] = {}
+db_dirty_keys: dict[str, Optional[set[Any]]] = {}
+
+# Store "name: serializer" pairs, of the serializer that the data in
+# db_blob_cache and db_key_blobs was made with
+db_serializers: dict[str, str] = {}
+
+# Store the names of the tables that could not be serialized with their
+# configured serializer, and fell back to pickle
+db_pickled: set[str] = set()
+
+# Serializers that tables can be stored with, as (dumps, loads) pairs
+SERIALIZERS = {
+    "pickle": (pickle.dumps, pickle.loads),
+    "typed": (serializer.dumps, serializer.loads),
+}
+
+# Mark the start of the data of keyed tables, and of tables that were
+# serialized with the typed serializer. Data without a marker is plain pickled
+# data, the data of a keyed table is a serialized dict of serialized keys
+KEYED_MAGIC = b"PGDBKEYED"
+TYPED_MAGIC = b"PGDBTYPED"
+TYPED_KEYED_MAGIC = b"PGDBTKEYED"
+
+# Marks the start of the header of table data given to the backends. Data that
+# does not start with it is plain pickled data, from before it had a header
+BLOB_MAGIC = b"PGDBBLOB"
+BLOB_VERSION = 1
+
+# Blob header: magic, blob format version, codec, CRC32 of the payload
+BLOB_HEADER = struct.Struct("<8sBBI")
+
+# Codecs that can compress blobs, the index of a codec is its ID in the header
+BLOB_CODECS = ("none", "zlib", "lzma")
 
 # Optimisation: store per-db bool on whether it got updated or not
 db_changed: dict[str, bool] = {}
 
 # store per-resource lock
-db_locks: dict[str, asyncio.Lock] = {}
+db_locks: dict[str, RWLock] = {}
+
+# lock that makes sure that only one flush runs at a time
+flush_lock = asyncio.Lock()
+
+# flush task that was started because too many tables were changed
+flush_task: Optional[asyncio.Task] = None
+
+# after a flush fails, no flush is started early until flush_retry_time, and
+# the delay doubles with every flush that fails in a row
+flush_retry_delay: float = 0
+flush_retry_time: float = 0
+
+# the storage backend in use, this is set on init
+backend: Optional[DBBackend] = None
 
 # bool to indicate whether db module was init
 is_init: bool = False
 
+# The journal is a local file that records every change to the DB, so that the
+# changes made since the last flush can be recovered after a crash. Changes
+# are first stored in journal_pending as (operation, name, key, value) tuples,
+# and are written to the journal file in batches
+journal_pending: list[tuple[str, str, Any, Any]] = []
+journal_file: Optional[BinaryIO] = None
+
+# Store "name: records" pairs of the encoded records in the journal file, so
+# that the journal can be rewritten without the records of the tables that
+# have been flushed since
+journal_records: dict[str, list[bytes]] = {}
 
-async def init():
+# lock that makes sure that the journal file is not written to and compacted at
+# the same time
+journal_lock = asyncio.Lock()
+
+# header of every record in the journal: length and CRC32 of the record
+JOURNAL_HEADER = struct.Struct("<II")
+
+
+def encode_blob(data: bytes, codec: str = common.DB_BLOB_CODEC):
     """
-    Initialise local cache and db channel. Call this function when the
-    bot boots up
+    Compress pickled table data, and add a header with the codec and checksum
     """
-    global is_init
+    if codec == "zlib":
+        payload = zlib.compress(data)
+    elif codec == "lzma":
+        payload = lzma.compress(data)
+    else:
+        payload = data
+
+    if len(payload) >= len(data):
+        # compression does not help on small tables
+        codec, payload = "none", data
+
+    header = BLOB_HEADER.pack(
+        BLOB_MAGIC, BLOB_VERSION, BLOB_CODECS.index(codec), zlib.crc32(payload)
+    )
+    return header + payload
+
+
+def decode_blob(blob: bytes):
+    """
+    Check the checksum of a blob made by encode_blob, and decompress it.
+    Raises ValueError if the blob is invalid
+    """
+    if not blob.startswith(BLOB_MAGIC):
+        return blob
+
+    _, version, codec_id, crc = BLOB_HEADER.unpack_from(blob)
+    if version > BLOB_VERSION:
+        raise ValueError(f"Unsupported DB blob format version {version}")
+
+    payload = memoryview(blob)[BLOB_HEADER.size :]
+    if zlib.crc32(payload) != crc:
+        raise ValueError("DB blob checksum mismatch")
+
+    if codec_id >= len(BLOB_CODECS):
+        raise ValueError(f"Unsupported DB blob codec {codec_id}")
+
+    codec = BLOB_CODECS[codec_id]
+    if codec == "zlib":
+        return zlib.decompress(payload)
+    if codec == "lzma":
+        return lzma.decompress(payload)
+    return bytes(payload)
+
+
+def get_default_backend() -> DBBackend:
+    """
+    Get the storage backend to use, based on the bot configuration. A local
+    SQLite DB is used if DB_PATH is set, the DB channel is used otherwise. In
+    test mode or generic mode, data is only stored in memory
+    """
+    if common.DB_PATH:
+        return SQLiteBackend(common.DB_PATH)
+
+    db_channel = getattr(common, "db_channel", None)
+    if common.TEST_MODE or common.GENERIC or db_channel is None:
+        return MemoryBackend()
 
-    if is_init or common.TEST_MODE or common.GENERIC:
-        is_init = True
+    return DiscordBackend(db_channel)
+
+
+async def init(db_backend: Optional[DBBackend] = None):
+    """
+    Initialise local cache and storage backend. Call this function when the
+    bot boots up. If no backend is passed, the default backend is used
+    """
+    global backend, is_init
+
+    if is_init:
         return
 
-    async for msg in common.db_channel.history():
-        if msg.attachments:
-            db_obj_cache[msg.content] = await msg.attachments[0].read()
-            db_changed[msg.content] = False
+    backend = get_default_backend() if db_backend is None else db_backend
+
+    start = time.perf_counter()
+    blobs = await backend.load()
+    print(
+        f"Loaded {len(blobs)} DB table(s) with {type(backend).__name__} in",
+        f"{(time.perf_counter() - start) * 1000:.2f} ms",
+    )
+    for name, blob in blobs.items():
+        try:
+            data = decode_blob(blob)
+            obj = _load(name, data)
+        except Exception as exc:
+            # a corrupt table should not stop the other tables from loading
+            db_key_blobs.pop(name, None)
+            db_dirty_keys.pop(name, None)
+            db_serializers.pop(name, None)
+            print(f"Skipping corrupt DB table '{name}':", repr(exc))
+            continue
+
+        db_stats[name].data_size = len(data)
+        db_stats[name].blob_size = len(blob)
+        db_obj_cache[name] = obj
+        db_versions[name] = 0
+        db_blob_cache[name] = (0, data)
+        db_changed[name] = False
+
+    if backend.persistent and common.DB_JOURNAL_PATH:
+        _replay_journal(common.DB_JOURNAL_PATH)
+        _open_journal(common.DB_JOURNAL_PATH)
+        journal_syncer.start()
 
     is_init = True
+    flusher.start()
+
+
+def _parse(blob: bytes):
+    """
+    Detect the format of serialized table data. Returns the serializer, whether
+    the table is keyed, and the serialized data without its marker
+    """
+    for magic, fmt, keyed in (
+        (TYPED_KEYED_MAGIC, "typed", True),
+        (TYPED_MAGIC, "typed", False),
+        (KEYED_MAGIC, "pickle", True),
+    ):
+        if blob.startswith(magic):
+            return fmt, keyed, blob[len(magic) :]
+
+    return "pickle", False, blob
+
+
+def _load(name: str, blob: bytes):
+    """
+    Deserialize the data of a table. Also keeps the serialized data of the keys
+    of keyed tables, so that they need not be serialized again
+    """
+    fmt, keyed, payload = _parse(blob)
+    loads = SERIALIZERS[fmt][1]
+    db_serializers[name] = fmt
+    if not keyed:
+        return loads(payload)
+
+    key_blobs: dict[Any, bytes] = loads(payload)
+    db_key_blobs[name] = key_blobs
+    db_dirty_keys[name] = set()
+    return {key: loads(key_blob) for key, key_blob in key_blobs.items()}
+
+
+def get_serializer(name: str):
+    """
+    Get the name of the serializer that a table is stored with
+    """
+    if name in db_pickled:
+        return "pickle"
+    return common.DB_TABLE_SERIALIZERS.get(name, common.DB_SERIALIZER)
+
+
+def _serialize_keys(name: str, fmt: str):
+    """
+    Serialize the keys of a keyed table in the cache with the given serializer.
+    Only the keys that changed since the last time are serialized
+    """
+    obj = db_obj_cache[name]
+    dumps = SERIALIZERS[fmt][0]
+    dirty_keys = db_dirty_keys.get(name)
+    key_blobs = db_key_blobs.get(name)
+    if dirty_keys is None or key_blobs is None or db_serializers.get(name) != fmt:
+        key_blobs = {key: dumps(value) for key, value in obj.items()}
+    else:
+        for key in dirty_keys:
+            if key in obj:
+                key_blobs[key] = dumps(obj[key])
+            else:
+                key_blobs.pop(key, None)
+
+    db_key_blobs[name] = key_blobs
+    db_dirty_keys[name] = set()
+    return key_blobs
+
+
+def _serialize(name: str, fmt: str):
+    """
+    Serialize a table in the cache with the given serializer
+    """
+    obj = db_obj_cache[name]
+    dumps = SERIALIZERS[fmt][0]
+    if not isinstance(obj, dict):
+        return (TYPED_MAGIC if fmt == "typed" else b"") + dumps(obj)
+
+    key_blobs = _serialize_keys(name, fmt)
+    return (TYPED_KEYED_MAGIC if fmt == "typed" else KEYED_MAGIC) + dumps(key_blobs)
+
+
+def _serialize_with(name: str, serialize: Callable[[str, str], Any]):
+    """
+    Serialize a table in the cache with its serializer, falling back to pickle
+    if the table holds types that its serializer cannot handle
+    """
+    fmt = get_serializer(name)
+    try:
+        data = serialize(name, fmt)
+    except TypeError as exc:
+        if fmt == "pickle":
+            raise
+
+        print(f"DB table '{name}' cannot use the {fmt} serializer:", exc)
+        db_pickled.add(name)
+        db_dirty_keys[name] = None
+        fmt = "pickle"
+        data = serialize(name, fmt)
+
+    db_serializers[name] = fmt
+    return data
+
+
+def _dump_keys(name: str) -> dict[Any, bytes]:
+    """
+    Get the serialized data of the keys of a keyed table in the cache. Unlike
+    _dump, this does not serialize the table as a whole, so its cost only
+    depends on the keys that changed
+    """
+    return _serialize_with(name, _serialize_keys)
+
+
+def _dump(name: str):
+    """
+    Get serialized data of a table in the cache, reusing the last serialized
+    data if the table did not change since then
+    """
+    obj = db_obj_cache[name]
+    fmt = get_serializer(name)
+    version = db_versions.get(name, 0)
+    blob_version, blob = db_blob_cache.get(name, (-1, b""))
+    if (
+        blob_version == version
+        and db_serializers.get(name) == fmt
+        and (not isinstance(obj, dict) or name in db_key_blobs)
+    ):
+        return blob
+
+    blob = _serialize_with(name, _serialize)
+    db_blob_cache[name] = (version, blob)
+    return blob
+
+
+async def flush():
+    """
+    Flush all the changed tables in the local cache to the storage backend.
+    Tables that got written to multiple times since the last flush are only
+    stored once
+    """
+    global flush_retry_delay, flush_retry_time
+
+    if not is_init or backend is None:
+        return
+
+    async with flush_lock:
+        failed = False
+        for name in [name for name, changed in db_changed.items() if changed]:
+            # mark table as unchanged before storing, so that writes that
+            # happen while storing get flushed the next time
+            db_changed[name] = False
+            stats = db_stats[name]
+            start = time.perf_counter()
+            try:
+                if name in db_obj_cache:
+                    data = _dump(name)
+                    blob = encode_blob(data)
+                    await backend.store(name, blob)
+                    stats.data_size = len(data)
+                    stats.blob_size = len(blob)
+                else:
+                    await backend.remove(name)
+                    stats.data_size = stats.blob_size = 0
+
+            except asyncio.CancelledError:
+                db_changed[name] = True
+                raise
+
+            except Exception as exc:
+                # a table failing to be stored should not stop the other tables
+                # from being flushed
+                db_changed[name] = True
+                failed = True
+                print(f"Failed to flush DB table '{name}':", exc)
+
+            else:
+                stats.flushes += 1
+                stats.flush_time.record(time.perf_counter() - start)
+
+        if failed:
+            # back off, so that a failing backend is not retried on every write
+            flush_retry_delay = min(
+                max(flush_retry_delay * 2, common.DB_FLUSH_RETRY_DELAY),
+                common.DB_FLUSH_INTERVAL,
+            )
+            flush_retry_time = time.perf_counter() + flush_retry_delay
+        else:
+            flush_retry_delay = 0
+
+        # the records of the tables that were stored are not needed anymore
+        await sync_journal(compact=True)
+
+
+def _journal(operation: str, name: str, key: Any = None, value: Any = None):
+    """
+    Record a change to the DB, to be written to the journal
+    """
+    if journal_file is None:
+        return
+
+    if operation in ("write", "delete"):
+        # the older changes of the table are overwritten by this one
+        journal_pending[:] = [rec for rec in journal_pending if rec[1] != name]
+
+    journal_pending.append((operation, name, key, value))
+
+
+def _replay_journal(path: str):
+    """
+    Apply the changes recorded in the journal to the local cache. The changed
+    tables get flushed to the backend on the next flush
+    """
+    try:
+        with open(path, "rb") as fobj:
+            data = fobj.read()
+    except FileNotFoundError:
+        return
+
+    cnt = 0
+    pos = 0
+    changed = set()
+    while pos + JOURNAL_HEADER.size <= len(data):
+        length, crc = JOURNAL_HEADER.unpack_from(data, pos)
+        pos += JOURNAL_HEADER.size
+        record = data[pos : pos + length]
+        if len(record) != length or zlib.crc32(record) != crc:
+            # the bot crashed while writing this record, skip the rest
+            print("Skipping incomplete DB journal record")
+            break
+
+        operation, name, key, value = pickle.loads(record)
+        if operation in ("write", "delete"):
+            journal_records[name] = []
+        journal_records.setdefault(name, []).append(
+            data[pos - JOURNAL_HEADER.size : pos + length]
+        )
+
+        pos += length
+        if operation == "write":
+            db_obj_cache[name] = value
+        elif operation == "delete":
+            db_obj_cache.pop(name, None)
+        elif operation == "set_key":
+            db_obj_cache.setdefault(name, {})[key] = value
+        elif operation == "delete_key" and name in db_obj_cache:
+            db_obj_cache[name].pop(key, None)
+
+        changed.add(name)
+        cnt += 1
+
+    for name in changed:
+        db_versions[name] = db_versions.get(name, 0) + 1
+        db_dirty_keys[name] = None
+        db_changed[name] = True
+
+    print(f"Replayed {cnt} DB journal record(s) on {len(changed)} table(s)")
+
+
+def _open_journal(path: str):
+    global journal_file
+    journal_file = open(path, "ab")
+
+
+def _write_journal(data: bytes, truncate: bool = False):
+    """
+    Write data to the journal file and fsync it, replacing the old contents of
+    the file if truncate is True. This blocks, so it is run in a thread
+    """
+    if journal_file is None:
+        return
+
+    if truncate:
+        journal_file.truncate(0)
+
+    journal_file.write(data)
+    journal_file.flush()
+    os.fsync(journal_file.fileno())
+
+
+async def sync_journal(compact: bool = False):
+    """
+    Write the pending records to the journal file. If compact is True, the
+    journal file is rewritten with only the records of the tables that have
+    changed since they were last flushed
+    """
+    async with journal_lock:
+        if journal_file is None or not (journal_pending or compact):
+            return
+
+        data = []
+        for record in journal_pending:
+            operation, name = record[:2]
+            pickled = pickle.dumps(record)
+            encoded = JOURNAL_HEADER.pack(len(pickled), zlib.crc32(pickled)) + pickled
+            if operation in ("write", "delete"):
+                # the older changes of the table are overwritten by this one
+                journal_records[name] = []
+            journal_records.setdefault(name, []).append(encoded)
+            data.append(encoded)
+
+        journal_pending.clear()
+        if compact:
+            for name in [name for name in journal_records if not db_changed.get(name)]:
+                del journal_records[name]
+
+            data = [rec for records in journal_records.values() for rec in records]
+
+        await asyncio.get_running_loop().run_in_executor(
+            None, _write_journal, b"".join(data), compact
+        )
+
+
+@tasks.loop(seconds=common.DB_JOURNAL_SYNC_INTERVAL)
+async def journal_syncer():
+    """
+    Routine that writes the pending records to the journal file
+    """
+    await sync_journal()
+
+
+@tasks.loop(seconds=common.DB_FLUSH_INTERVAL)
+async def flusher():
+    """
+    Routine that flushes the changed tables in the local cache to the DB
+    """
+    await flush()
+
+
+def _check_flush_threshold():
+    """
+    Start a flush without waiting for the flusher routine, if too many
+    tables have changed since the last flush. Call this function when a table
+    becomes changed
+    """
+    global flush_task
+
+    if flush_lock.locked() or time.perf_counter() < flush_retry_time:
+        return
+
+    if flush_task is not None and not flush_task.done():
+        return
+
+    if sum(db_changed.values()) >= common.DB_FLUSH_THRESHOLD:
+        flush_task = asyncio.ensure_future(flush())
 
 
 async def quit():
@@ -51,21 +939,22 @@ async def quit():
     Flushes local cache for storage to the DB, and cleans up
     """
     global is_init
-    if not is_init or common.TEST_MODE or common.GENERIC:
+    if not is_init or backend is None:
         is_init = False
         return
 
-    print("Calling cleanup functions!")
-    async for msg in common.db_channel.history():
-        if msg.content in db_obj_cache and db_changed[msg.content]:
-            await msg.delete()
+    global journal_file
 
-    for name, picked in db_obj_cache.items():
-        if not db_changed[name]:
-            continue
-
-        with io.BytesIO(picked) as fobj:
-            await common.db_channel.send(name, file=discord.File(fobj))
+    print("Calling cleanup functions!")
+    flusher.cancel()
+    journal_syncer.cancel()
+    await sync_journal()
+    await flush()
+    await backend.close()
+    if journal_file is not None:
+        journal_file.close()
+        journal_file = None
+        journal_records.clear()
 
     print("Successfully called cleanup functions")
     is_init = False
@@ -74,18 +963,24 @@ async def quit():
 class DiscordDB:
     """
     DiscordDB is a class to interface with a DB like solution, that stores data
-    via discord messages. Uses heavy caching, and saves to DB only on program
-    exit
+    via discord messages, or any other storage backend. Uses heavy caching, and
+    saves changed data to the backend routinely in the background, and on
+    program exit
     """
 
-    def __init__(self, name: str):
+    def __init__(self, name: str, readonly: bool = False):
         """
-        Initialise Discord DB Object
+        Initialise Discord DB Object. If readonly is True, the DB object can
+        only be read from, but the DB can be read by many at the same time
         """
         self.name = name
+        self.readonly = readonly
         if name not in db_locks:
-            db_locks[name] = asyncio.Lock()
+            db_locks[name] = RWLock()
         self._lock = db_locks[name]
+        self._held = False
+        self._held_since = 0.0
+        self._stats = db_stats[name]
 
     async def acquire(self):
         """
@@ -99,13 +994,19 @@ class DiscordDB:
         else:
             raise RuntimeError("pgbot.db module was not init")
 
-        await self._lock.acquire()
+        start = time.perf_counter()
+        await self._lock.acquire(not self.readonly)
+        self._held_since = time.perf_counter()
+        self._stats.lock_wait.record(self._held_since - start)
+        self._held = True
 
     def release(self):
         """
         Release internal resource lock
         """
-        self._lock.release()
+        self._held = False
+        self._lock.release(not self.readonly)
+        self._stats.lock_hold.record(time.perf_counter() - self._held_since)
 
     async def __aenter__(self):
         """
@@ -121,37 +1022,172 @@ class DiscordDB:
         self.release()
 
     def _check_active(self):
-        if not self._lock.locked() or not is_init:
+        if not self._held or not is_init:
             raise RuntimeError("Invalid operation on unlocked data object")
 
+    def _check_writable(self):
+        self._check_active()
+        if self.readonly:
+            raise RuntimeError("Invalid write operation on readonly data object")
+
+    @property
+    def version(self):
+        """
+        Version counter of the DB, this changes every time the DB is changed
+        """
+        return db_versions.get(self.name, 0)
+
     def get(self, failobj=None):
         """
-        Get object of discord DB
+        Get a copy of the object of discord DB. The returned object can be
+        freely modified, and written back with the write method
         """
         self._check_active()
-        try:
-            return pickle.loads(db_obj_cache[self.name])
-        except KeyError:
+        self._stats.reads += 1
+        if self.name not in db_obj_cache:
             return failobj
 
-    def write(self, obj):
+        if isinstance(db_obj_cache[self.name], dict):
+            # copy the table key by key, so that only the keys that changed
+            # are serialized
+            key_blobs = _dump_keys(self.name)
+            loads = SERIALIZERS[db_serializers[self.name]][1]
+            return {key: loads(key_blob) for key, key_blob in key_blobs.items()}
+
+        blob = _dump(self.name)
+        loads = SERIALIZERS[db_serializers[self.name]][1]
+        return loads(_parse(blob)[2])
+
+    def snapshot(self, failobj=None):
         """
-        Store object in DB
+        Get the object of discord DB without copying it. This is a lot cheaper
+        than the get method, but the returned object is shared with every
+        other user of the DB, so it must never be modified
         """
         self._check_active()
-        dumped = pickle.dumps(obj)
-        if dumped != db_obj_cache.get(self.name):
-            db_obj_cache[self.name] = dumped
+        self._stats.snapshots += 1
+        if self.name not in db_obj_cache:
+            return failobj
+
+        db_shared.add(self.name)
+        return db_obj_cache[self.name]
+
+    def _changed(self, key: Any = None, whole: bool = True):
+        if whole:
+            db_dirty_keys[self.name] = None
+        else:
+            dirty_keys = db_dirty_keys.get(self.name)
+            if dirty_keys is not None:
+                dirty_keys.add(key)
+
+        db_versions[self.name] = db_versions.get(self.name, 0) + 1
+        self._stats.writes += 1
+        if not db_changed.get(self.name):
             db_changed[self.name] = True
+            _check_flush_threshold()
+
+    def write(self, obj):
+        """
+        Store object in DB. The object is stored without copying it, so it
+        must not be modified after it was written
+        """
+        self._check_writable()
+        if self.name not in db_obj_cache or db_obj_cache[self.name] != obj:
+            db_obj_cache[self.name] = obj
+            db_shared.discard(self.name)
+            self._changed()
+            _journal("write", self.name, value=obj)
 
     def delete(self):
         """
         Delete DB, returns whether it was deleted successfully
         """
-        self._check_active()
-        db_changed[self.name] = True
+        self._check_writable()
         try:
             db_obj_cache.pop(self.name)
-            return True
         except KeyError:
             return False
+
+        db_blob_cache.pop(self.name, None)
+        db_key_blobs.pop(self.name, None)
+        db_serializers.pop(self.name, None)
+        db_pickled.discard(self.name)
+        db_shared.discard(self.name)
+        self._changed()
+        _journal("delete", self.name)
+        return True
+
+    def _get_keyed(self, modify: bool = False) -> Optional[dict[Any, Any]]:
+        """
+        Get the object of a keyed DB. If it is going to be modified in place, it
+        is created if it does not exist, and copied first if it was handed out
+        with the snapshot method
+        """
+        if modify:
+            self._check_writable()
+        else:
+            self._check_active()
+
+        obj = db_obj_cache.get(self.name)
+        if obj is not None and not isinstance(obj, dict):
+            raise TypeError(f"DB '{self.name}' is not a keyed DB (a dict)")
+
+        if modify:
+            if obj is None:
+                obj = db_obj_cache[self.name] = {}
+                self._changed()
+
+            elif self.name in db_shared:
+                obj = db_obj_cache[self.name] = dict(obj)
+                db_shared.discard(self.name)
+
+        return obj
+
+    def get_key(self, key: Any, failobj=None):
+        """
+        Get a copy of the value of a key in a keyed DB, like the get method
+        but for only one key
+        """
+        obj = self._get_keyed()
+        self._stats.reads += 1
+        if obj is None or key not in obj:
+            return failobj
+
+        key_blob = _dump_keys(self.name)[key]
+        loads = SERIALIZERS[db_serializers[self.name]][1]
+        return loads(key_blob)
+
+    def set_key(self, key: Any, value: Any):
+        """
+        Store a value under a key in a keyed DB. Only the changed key is
+        pickled again when the DB is flushed. The value is stored without
+        copying it, so it must not be modified after it was set
+        """
+        obj = self._get_keyed(modify=True)
+        if key not in obj or obj[key] != value:
+            obj[key] = value
+            self._changed(key, whole=False)
+            _journal("set_key", self.name, key, value)
+
+    def delete_key(self, key: Any):
+        """
+        Delete a key from a keyed DB, returns whether it was deleted
+        successfully
+        """
+        self._check_writable()
+        obj = self._get_keyed()
+        if obj is None or key not in obj:
+            return False
+
+        del self._get_keyed(modify=True)[key]
+        self._changed(key, whole=False)
+        _journal("delete_key", self.name, key)
+        return True
+
+    def iter_keys(self):
+        """
+        Iterate over the keys of a keyed DB. Keys can be set and deleted while
+        iterating
+        """
+        obj = self._get_keyed()
+        return iter(() if obj is None else tuple(obj))
@@ -7,11 +7,13 @@ This file defines some utitities and functions for the bots emotion system
 """
 import random
 import math
+import time
+
 import discord
-import unidecode
+from discord.ext import tasks
 
 from pgbot import common, db
-from pgbot.utils import embed_utils, utils
+from pgbot.utils import embed_utils, triggers, utils
 
 EMOTION_CAPS = {
     "happy": (-100, 100),
@@ -20,56 +22,165 @@ EMOTION_CAPS = {
     "confused": (0, 100),
 }
 
+# Finds bonks and dad joke triggers in messages
+trigger_matcher = triggers.TriggerMatcher(common.BONK)
+
+# Emotions change on their own over time. Every emotion decays towards 0 with
+# the given half-life in seconds (None for no decay), and drifts by the given
+# amount per minute. A drift makes the emotion settle at a value other than 0
+EMOTION_DECAY = {
+    "happy": 2 * 60 * 60,
+    "anger": 30 * 60,
+    "bored": None,
+    "confused": 10 * 60,
+}
+EMOTION_DRIFT = {
+    "happy": 0,
+    "anger": 0,
+    "bored": 2,  # the bot gets bored when nobody uses it
+    "confused": 0,
+}
+
+# The emotions of the bot live in memory, as "name: (value, timestamp)" pairs of
+# the value of every emotion at the time it was last updated. The current value
+# is computed from these lazily, when it is needed. The emotions are only saved
+# to the "emotions" DB table every EMOTION_SAVE_INTERVAL seconds if they
+# changed, and on quit
+emotions: dict[str, tuple[float, float]] = {}
+emotions_changed: bool = False
+is_init: bool = False
 
-async def update(emotion_name: str, value: int):
+
+async def init():
     """
-    Update emotion characteristic 'emotion_name' with value 'value' integer
+    Load the emotions from the DB, call this function after the DB was init.
+    This runs again when the bot reconnects, the emotions in memory are newer
+    than the saved ones then, so they are kept
     """
-    async with db.DiscordDB("emotions") as db_obj:
-        emotions = db_obj.get({})
-        try:
-            emotions[emotion_name] += value
-        except KeyError:
+    global is_init
+
+    if not is_init:
+        await _load()
+        is_init = True
+
+    if not saver.is_running():
+        saver.start()
+
+
+async def _load():
+    """
+    Load the emotions from the DB into memory
+    """
+    global emotions_changed
+
+    async with db.DiscordDB("emotions", readonly=True) as db_obj:
+        now = time.time()
+        for emotion_name, value in db_obj.snapshot({}).items():
+            if not isinstance(value, tuple):
+                # emotions were stored without timestamps before
+                value = (value, now)
             emotions[emotion_name] = value
 
-        emotions[emotion_name] = utils.clamp(
-            emotions[emotion_name], *EMOTION_CAPS[emotion_name]
-        )
-        db_obj.write(emotions)
+    emotions_changed = False
 
 
-async def get(emotion_name: str):
+async def save():
     """
-    Get emotion characteristic 'emotion_name'
+    Save the emotions to the DB, if they changed since the last save
     """
+    global emotions_changed
+
+    if not emotions_changed:
+        return
+
     async with db.DiscordDB("emotions") as db_obj:
-        emotions = db_obj.get({})
+        emotions_changed = False
+        db_obj.write(dict(emotions))
+
 
-    try:
-        return emotions[emotion_name]
-    except KeyError:
-        return 0
+@tasks.loop(seconds=common.EMOTION_SAVE_INTERVAL)
+async def saver():
+    """
+    Routine that saves the emotions to the DB
+    """
+    await save()
+
+
+async def quit():
+    """
+    Save the emotions to the DB one last time, call this before db.quit
+    """
+    saver.cancel()
+    await save()
+
+
+def _evaluate(emotion_name: str, now: float):
+    """
+    Compute the value of an emotion at the given time, applying the decay and
+    drift since it was last updated
+    """
+    value, last_time = emotions.get(emotion_name, (0, now))
+    elapsed = max(now - last_time, 0)
+    drift = EMOTION_DRIFT[emotion_name] / 60
+    half_life = EMOTION_DECAY[emotion_name]
+    if half_life:
+        # solution of dv/dt = drift - rate * v, which settles at drift / rate
+        rate = math.log(2) / half_life
+        target = drift / rate
+        value = target + (value - target) * math.exp(-rate * elapsed)
+    else:
+        value += drift * elapsed
+
+    # the value changes monotonically, so clamping it only at the end is the
+    # same as clamping it all the time
+    return utils.clamp(value, *EMOTION_CAPS[emotion_name])
+
+
+def update(emotion_name: str, value: int):
+    """
+    Update emotion characteristic 'emotion_name' with value 'value' integer
+    """
+    global emotions_changed
+
+    now = time.time()
+    new_value = _evaluate(emotion_name, now) + value
+    emotions[emotion_name] = (utils.clamp(new_value, *EMOTION_CAPS[emotion_name]), now)
+    emotions_changed = True
+
+
+def get(emotion_name: str) -> int:
+    """
+    Get emotion characteristic 'emotion_name'
+    """
+    return round(_evaluate(emotion_name, time.time()))
+
+
+def get_all():
+    """
+    Get a copy of all the emotion characteristics
+    """
+    return {emotion_name: get(emotion_name) for emotion_name in EMOTION_CAPS}
 
 
 async def check_bonk(msg: discord.Message):
     """
     Function to check bonk, update emotion state, and reply when bonked
     """
-    if common.BONK not in msg.content:
+    bonks = trigger_matcher.classify(msg.content).bonks
+    if not bonks:
         return
 
-    bonks = msg.content.count(common.BONK)
-    if await get("anger") + bonks > 30:
+    if get("anger") + bonks > 30:
         await embed_utils.send(
             msg.channel,
             title="Did you hit the snek?",
             description="You mortal mammal! How you dare to boncc a snake?",
             thumbnail_url="https://cdn.discordapp.com/emojis/779775305224159232.gif",
         )
-    bonks = math.floor(math.log2(msg.content.count(common.BONK) + 1))
+    bonks = math.floor(math.log2(bonks + 1))
 
-    await update("anger", bonks)
-    await update("happy", -bonks)
+    update("anger", bonks)
+    update("happy", -bonks)
 
 
 async def dad_joke(msg: discord.Message):
@@ -80,57 +191,43 @@ async def dad_joke(msg: discord.Message):
     if common.bot.user is None:
         return
 
-    if await utils.get_channel_feature("dadjokes", msg.channel):
+    if utils.get_channel_feature("dadjokes", msg.channel):
         return
 
-    lowered = unidecode.unidecode(msg.content.lower().strip())
-    for trigger in ("i am", "i'm"):
-        if lowered == trigger:
-            await msg.channel.send(random.choice(common.SHAKESPEARE_QUOTES))
-            return
-
-        if trigger in lowered and len(lowered) < 60:
-            ind = lowered.index(trigger)
-            if ind and not msg.content[ind - 1].isspace():
-                return
+    msg_triggers = trigger_matcher.classify(msg.content)
+    if msg_triggers.dad_joke_only:
+        await msg.channel.send(random.choice(common.SHAKESPEARE_QUOTES))
 
-            name = msg.content[ind + len(trigger) :]
-            if not name or not name[0].isspace():
-                return
-
-            name = name.strip()
-            for char in (",", "\n", "."):
-                if char in name:
-                    name = name.split(char)[0]
-
-            if name:
-                await msg.channel.send(
-                    f"Hi {name}! I am <@!{common.bot.user.id}>",
-                    allowed_mentions=discord.AllowedMentions.none(),
-                )
-            return
+    elif msg_triggers.dad_joke_name:
+        await msg.channel.send(
+            f"Hi {msg_triggers.dad_joke_name}! I am <@!{common.bot.user.id}>",
+            allowed_mentions=discord.AllowedMentions.none(),
+        )
 
 
-async def euphoria():
+def euphoria():
     """
     Trigger a state of "euphoria" emotion, extremely happy and positive bot
     """
-    async with db.DiscordDB("emotions") as db_obj:
-        db_obj.write(
-            {
-                "happy": EMOTION_CAPS["happy"][1],
-                "anger": EMOTION_CAPS["anger"][0],
-                "bored": 0,
-                "confused": 0,
-            }
-        )
+    global emotions_changed
+
+    now = time.time()
+    emotions.update(
+        {
+            "happy": (EMOTION_CAPS["happy"][1], now),
+            "anger": (EMOTION_CAPS["anger"][0], now),
+            "bored": (0, now),
+            "confused": (0, now),
+        }
+    )
+    emotions_changed = True
 
 
 async def server_boost(msg: discord.Message):
     """
     Helper to handle boost, trigger euphoria emotion state
     """
-    await euphoria()
+    euphoria()
     if common.TEST_MODE:
         return
 
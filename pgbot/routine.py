@@ -11,13 +11,12 @@ import asyncio
 import datetime
 import io
 import os
-import random
 import sys
 
 import discord
 from discord.ext import tasks
 
-from pgbot import common, db, emotion
+from pgbot import common, db
 from pgbot.utils import utils
 
 
@@ -25,10 +24,10 @@ async def handle_reminders(reminder_obj: db.DiscordDB):
     """
     Handle reminder routines
     """
-    reminders = reminder_obj.get({})
-
-    new_reminders = {}
-    for mem_id, reminder_dict in reminders.items():
+    # the snapshot is not modified by set_key and delete_key below, so it is
+    # safe to iterate over it
+    for mem_id, reminder_dict in reminder_obj.snapshot({}).items():
+        new_reminder_dict = {}
         for dt, (msg, chan_id, msg_id) in reminder_dict.items():
             if datetime.datetime.utcnow() >= dt:
                 content = f"__**Reminder for you:**__\n>>> {msg}"
@@ -67,13 +66,14 @@ async def handle_reminders(reminder_obj: db.DiscordDB):
                     except discord.HTTPException:
                         pass
             else:
-                if mem_id not in new_reminders:
-                    new_reminders[mem_id] = {}
-
-                new_reminders[mem_id][dt] = (msg, chan_id, msg_id)
+                new_reminder_dict[dt] = (msg, chan_id, msg_id)
 
-    if reminders != new_reminders:
-        reminder_obj.write(new_reminders)
+        # only the reminders of the members whose reminders were sent are
+        # written, the other members are left untouched
+        if not new_reminder_dict:
+            reminder_obj.delete_key(mem_id)
+        elif len(new_reminder_dict) != len(reminder_dict):
+            reminder_obj.set_key(mem_id, new_reminder_dict)
 
 
 @tasks.loop(seconds=5)
@@ -118,9 +118,6 @@ async def routine():
     async with db.DiscordDB("reminders") as db_obj:
         await handle_reminders(db_obj)
 
-    if random.randint(0, 4) == 0:
-        await emotion.update("bored", 1)
-
     await common.bot.change_presence(
         activity=discord.Activity(
             type=discord.ActivityType.watching,
@@ -0,0 +1,263 @@
+"""
+This file is a part of the source code for the PygameCommunityBot.
+This project has been licensed under the MIT license.
+Copyright (c) 2020-present PygameCommunityDiscord
+
+This file defines a small typed serializer, that is used by the DB as a safer
+alternative to pickle. It only handles the types that DB tables are made of:
+dict, list, tuple, int, float, str, bytes, bool, datetime and None, but not
+subclasses of them, which would lose their type. Loading data can never run
+arbitrary code, unlike unpickling
+"""
+
+import datetime
+import struct
+from typing import Any, Callable
+
+# Every value starts with a one byte tag, that is followed by the data of the
+# value. Containers and variable length values store their length first
+TAG_NONE = 0x00
+TAG_FALSE = 0x01
+TAG_TRUE = 0x02
+TAG_INT = 0x03  # fits in a signed 64 bit integer
+TAG_BIGINT = 0x04  # length prefixed, signed little endian bytes
+TAG_FLOAT = 0x05
+TAG_STR = 0x06
+TAG_BYTES = 0x07
+TAG_LIST = 0x08
+TAG_TUPLE = 0x09
+TAG_DICT = 0x0A
+TAG_DATETIME = 0x0B  # length prefixed ISO 8601 string
+
+_TAG_LEN = struct.Struct("<BI")
+_TAG_INT = struct.Struct("<Bq")
+_TAG_FLOAT = struct.Struct("<Bd")
+_LEN = struct.Struct("<I")
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+
+_INT_MIN = -(2**63)
+_INT_MAX = 2**63 - 1
+
+_NONE = bytes((TAG_NONE,))
+_FALSE = bytes((TAG_FALSE,))
+_TRUE = bytes((TAG_TRUE,))
+
+
+def _encode_none(_, out: list[bytes]):
+    out.append(_NONE)
+
+
+def _encode_bool(obj: bool, out: list[bytes]):
+    out.append(_TRUE if obj else _FALSE)
+
+
+def _encode_int(obj: int, out: list[bytes]):
+    if _INT_MIN <= obj <= _INT_MAX:
+        out.append(_TAG_INT.pack(TAG_INT, obj))
+    else:
+        data = obj.to_bytes(obj.bit_length() // 8 + 1, "little", signed=True)
+        out.append(_TAG_LEN.pack(TAG_BIGINT, len(data)))
+        out.append(data)
+
+
+def _encode_float(obj: float, out: list[bytes]):
+    out.append(_TAG_FLOAT.pack(TAG_FLOAT, obj))
+
+
+def _encode_str(obj: str, out: list[bytes]):
+    data = obj.encode("utf-8", "surrogatepass")
+    out.append(_TAG_LEN.pack(TAG_STR, len(data)))
+    out.append(data)
+
+
+def _encode_bytes(obj: bytes, out: list[bytes]):
+    out.append(_TAG_LEN.pack(TAG_BYTES, len(obj)))
+    out.append(bytes(obj))
+
+
+def _encode_list(obj: list, out: list[bytes]):
+    out.append(_TAG_LEN.pack(TAG_LIST, len(obj)))
+    for item in obj:
+        _encode(item, out)
+
+
+def _encode_tuple(obj: tuple, out: list[bytes]):
+    out.append(_TAG_LEN.pack(TAG_TUPLE, len(obj)))
+    for item in obj:
+        _encode(item, out)
+
+
+def _encode_dict(obj: dict, out: list[bytes]):
+    out.append(_TAG_LEN.pack(TAG_DICT, len(obj)))
+    for key, value in obj.items():
+        _encode(key, out)
+        _encode(value, out)
+
+
+def _encode_datetime(obj: datetime.datetime, out: list[bytes]):
+    data = obj.isoformat().encode()
+    out.append(_TAG_LEN.pack(TAG_DATETIME, len(data)))
+    out.append(data)
+
+
+_ENCODERS: dict[type, Callable[[Any, list[bytes]], None]] = {
+    type(None): _encode_none,
+    bool: _encode_bool,
+    int: _encode_int,
+    float: _encode_float,
+    str: _encode_str,
+    bytes: _encode_bytes,
+    list: _encode_list,
+    tuple: _encode_tuple,
+    dict: _encode_dict,
+    datetime.datetime: _encode_datetime,
+}
+
+
+def _encode(obj: Any, out: list[bytes]):
+    """
+    Append the encoded data of an object to a list of bytes
+    """
+    try:
+        encoder = _ENCODERS[type(obj)]
+    except KeyError:
+        # subclasses (like namedtuples and enums) are not supported either,
+        # they would be loaded as their base type
+        raise TypeError(
+            f"Object of type '{type(obj).__name__}' cannot be serialized"
+        ) from None
+
+    encoder(obj, out)
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serialize an object. Raises TypeError if the object contains a type that
+    is not supported
+    """
+    out: list[bytes] = []
+    _encode(obj, out)
+    return b"".join(out)
+
+
+def _decode_none(data: bytes, pos: int):
+    return None, pos
+
+
+def _decode_false(data: bytes, pos: int):
+    return False, pos
+
+
+def _decode_true(data: bytes, pos: int):
+    return True, pos
+
+
+def _decode_int(data: bytes, pos: int):
+    return _INT.unpack_from(data, pos)[0], pos + 8
+
+
+def _decode_float(data: bytes, pos: int):
+    return _FLOAT.unpack_from(data, pos)[0], pos + 8
+
+
+def _decode_sized(data: bytes, pos: int):
+    """
+    Get the raw data of a length prefixed value
+    """
+    (length,) = _LEN.unpack_from(data, pos)
+    pos += 4
+    raw = data[pos : pos + length]
+    if len(raw) != length:
+        raise ValueError("Serialized data is truncated")
+    return raw, pos + length
+
+
+def _decode_bigint(data: bytes, pos: int):
+    raw, pos = _decode_sized(data, pos)
+    return int.from_bytes(raw, "little", signed=True), pos
+
+
+def _decode_str(data: bytes, pos: int):
+    raw, pos = _decode_sized(data, pos)
+    return raw.decode("utf-8", "surrogatepass"), pos
+
+
+def _decode_bytes(data: bytes, pos: int):
+    return _decode_sized(data, pos)
+
+
+def _decode_datetime(data: bytes, pos: int):
+    raw, pos = _decode_sized(data, pos)
+    return datetime.datetime.fromisoformat(raw.decode()), pos
+
+
+def _decode_list(data: bytes, pos: int):
+    (length,) = _LEN.unpack_from(data, pos)
+    pos += 4
+    items = []
+    for _ in range(length):
+        item, pos = _decode(data, pos)
+        items.append(item)
+    return items, pos
+
+
+def _decode_tuple(data: bytes, pos: int):
+    items, pos = _decode_list(data, pos)
+    return tuple(items), pos
+
+
+def _decode_dict(data: bytes, pos: int):
+    (length,) = _LEN.unpack_from(data, pos)
+    pos += 4
+    obj = {}
+    for _ in range(length):
+        key, pos = _decode(data, pos)
+        obj[key], pos = _decode(data, pos)
+    return obj, pos
+
+
+_DECODERS: dict[int, Callable[[bytes, int], tuple[Any, int]]] = {
+    TAG_NONE: _decode_none,
+    TAG_FALSE: _decode_false,
+    TAG_TRUE: _decode_true,
+    TAG_INT: _decode_int,
+    TAG_BIGINT: _decode_bigint,
+    TAG_FLOAT: _decode_float,
+    TAG_STR: _decode_str,
+    TAG_BYTES: _decode_bytes,
+    TAG_LIST: _decode_list,
+    TAG_TUPLE: _decode_tuple,
+    TAG_DICT: _decode_dict,
+    TAG_DATETIME: _decode_datetime,
+}
+
+
+def _decode(data: bytes, pos: int) -> tuple[Any, int]:
+    """
+    Decode the value that starts at the given position of the data, returns
+    the value and the position after it
+    """
+    try:
+        decoder = _DECODERS[data[pos]]
+    except KeyError:
+        raise ValueError(f"Invalid tag {data[pos]:#04x} in serialized data") from None
+
+    return decoder(data, pos + 1)
+
+
+def loads(data: bytes) -> Any:
+    """
+    Deserialize data made by dumps. Raises ValueError if the data is invalid
+    """
+    data = bytes(data)
+    try:
+        obj, pos = _decode(data, 0)
+    except (IndexError, TypeError, struct.error, UnicodeDecodeError) as exc:
+        raise ValueError("Serialized data is truncated or corrupt") from exc
+
+    if pos > len(data):
+        raise ValueError("Serialized data is truncated")
+    if pos < len(data):
+        raise ValueError("Serialized data has trailing bytes")
+    return obj
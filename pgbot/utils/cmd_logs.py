@@ -0,0 +1,75 @@
+"""
+This file is a part of the source code for the PygameCommunityBot.
+This project has been licensed under the MIT license.
+Copyright (c) 2020-present PygameCommunityDiscord
+
+This file defines the command logs, that link the messages that invoked
+recent commands to the responses of the bot, so that edited commands can be
+run again in their old response message. Only the IDs of the messages are
+kept, in both directions, so that either message can be looked up in constant
+time when it is deleted
+"""
+
+from __future__ import annotations
+
+import collections
+from typing import Optional
+
+import discord
+
+from pgbot import common
+from pgbot.utils import message_cache
+
+# response message IDs by invoke message ID, the least recently used one first
+responses: collections.OrderedDict[int, int] = collections.OrderedDict()
+
+# invoke message IDs by response message ID
+invokes: dict[int, int] = {}
+
+
+def add(invoke_msg_id: int, response_msg_id: int):
+    """
+    Link the message that invoked a command to the response of the bot to it,
+    replacing its old response if it had one
+    """
+    remove(invoke_msg_id)
+    remove(response_msg_id)
+
+    responses[invoke_msg_id] = response_msg_id
+    invokes[response_msg_id] = invoke_msg_id
+    if len(responses) > common.CMD_LOGS_SIZE:
+        _, old_response_msg_id = responses.popitem(last=False)
+        del invokes[old_response_msg_id]
+
+
+def remove(msg_id: int):
+    """
+    Remove the link of a message that was deleted, which can either be an
+    invoke message or a response message
+    """
+    response_msg_id = responses.pop(msg_id, None)
+    if response_msg_id is not None:
+        del invokes[response_msg_id]
+        return
+
+    invoke_msg_id = invokes.pop(msg_id, None)
+    if invoke_msg_id is not None:
+        del responses[invoke_msg_id]
+
+
+def get_response(invoke_msg: discord.Message) -> Optional[discord.Message]:
+    """
+    Get the response message of the bot to a command, None if it is not
+    logged. The response is in the same channel as the command, if it is not
+    cached a partial message is returned
+    """
+    response_msg_id = responses.get(invoke_msg.id)
+    if response_msg_id is None:
+        return None
+
+    responses.move_to_end(invoke_msg.id)
+    response_msg = message_cache.get(response_msg_id, invoke_msg.channel.id)
+    if response_msg is None:
+        return invoke_msg.channel.get_partial_message(response_msg_id)
+
+    return response_msg
@@ -0,0 +1,103 @@
+"""
+This file is a part of the source code for the PygameCommunityBot.
+This project has been licensed under the MIT license.
+Copyright (c) 2020-present PygameCommunityDiscord
+
+This file defines a cache of recently seen messages, that is used to resolve
+message arguments of commands without API calls. It is fed by the messages
+that the bot sees being sent and edited (including its own), and messages are
+dropped from it when they are deleted, edited or reacted to without the new
+state being known
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+from typing import Optional
+
+import discord
+
+from pgbot import common
+
+# messages by ID, the least recently used one first
+messages: collections.OrderedDict[int, discord.Message] = collections.OrderedDict()
+
+# fetches of messages that are in progress, by channel ID and message ID.
+# Concurrent fetches of the same message wait on the same fetch
+fetches: dict[tuple[int, int], asyncio.Task] = {}
+
+
+def add(msg: discord.Message):
+    """
+    Add a message to the cache, or replace it with a newer version of it
+    """
+    messages[msg.id] = msg
+    messages.move_to_end(msg.id)
+    if len(messages) > common.MESSAGE_CACHE_SIZE:
+        messages.popitem(last=False)
+
+
+def remove(msg_id: int):
+    """
+    Remove a message from the cache, because it was deleted or its cached
+    version is outdated
+    """
+    messages.pop(msg_id, None)
+
+    # a fetch that is in progress might get the outdated version too, so it
+    # must not be cached
+    for key in [key for key in fetches if key[1] == msg_id]:
+        del fetches[key]
+
+
+def get(msg_id: int, channel_id: Optional[int] = None) -> Optional[discord.Message]:
+    """
+    Get a message from the cache, None if it is not cached. If channel_id is
+    given, the message must also be in that channel
+    """
+    msg = messages.get(msg_id)
+    if msg is None or (channel_id is not None and msg.channel.id != channel_id):
+        return None
+
+    messages.move_to_end(msg_id)
+    return msg
+
+
+async def _fetch(channel: discord.abc.Messageable, msg_id: int):
+    """
+    Fetch a message over REST, and cache it unless it has been invalidated
+    while it was being fetched
+    """
+    key = (channel.id, msg_id)
+    try:
+        msg = await channel.fetch_message(msg_id)
+    except BaseException:
+        if fetches.get(key) is asyncio.current_task():
+            del fetches[key]
+        raise
+
+    if fetches.get(key) is asyncio.current_task():
+        del fetches[key]
+        add(msg)
+
+    return msg
+
+
+async def fetch(channel: discord.abc.Messageable, msg_id: int) -> discord.Message:
+    """
+    Get a message of a channel from the cache, or fetch it if it is not cached.
+    Raises the same exceptions as channel.fetch_message
+    """
+    msg = get(msg_id, channel.id)
+    if msg is not None:
+        return msg
+
+    key = (channel.id, msg_id)
+    task = fetches.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch(channel, msg_id))
+        fetches[key] = task
+
+    # a cancelled command must not cancel the fetch for the others
+    return await asyncio.shield(task)
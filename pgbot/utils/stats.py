@@ -0,0 +1,57 @@
+"""
+This file is a part of the source code for the PygameCommunityBot.
+This project has been licensed under the MIT license.
+Copyright (c) 2020-present PygameCommunityDiscord
+
+This file defines the utilities that the bot uses to keep statistics about
+itself, like the timings of DB operations and of the message stages
+"""
+
+
+class Histogram:
+    """
+    A cheap latency histogram, with buckets that are powers of two of
+    microseconds. Keeps the count, total and maximum of the recorded values
+    """
+
+    # bucket i holds values below 2 ** i microseconds, the last bucket holds
+    # everything bigger (above ~35 minutes)
+    BUCKETS = 32
+
+    def __init__(self):
+        self.buckets = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        """
+        Record a value, in seconds
+        """
+        index = int(seconds * 1_000_000).bit_length()
+        self.buckets[min(index, self.BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent: float):
+        """
+        Get an upper bound of the given percentile of the recorded values, in
+        seconds. This is only as precise as the buckets
+        """
+        if not self.count:
+            return 0.0
+
+        target = self.count * percent / 100
+        seen = 0
+        for index, cnt in enumerate(self.buckets):
+            seen += cnt
+            if seen >= target:
+                return min((1 << index) / 1_000_000, self.max)
+
+        return self.max
@@ -0,0 +1,132 @@
+"""
+This file is a part of the source code for the PygameCommunityBot.
+This project has been licensed under the MIT license.
+Copyright (c) 2020-present PygameCommunityDiscord
+
+This file defines a matcher that finds everything in a message that the bot
+reacts to (bonks and dad joke triggers) at once
+"""
+
+from __future__ import annotations
+
+import functools
+import re
+from typing import Iterable, NamedTuple, Optional
+
+import unidecode
+
+# characters that end the name in a dad joke
+DAD_JOKE_NAME_END = re.compile(r"[,\n.]")
+
+
+class MessageTriggers(NamedTuple):
+    """
+    Everything that the bot reacts to in a message
+    """
+
+    # number of bonk emojis in the message
+    bonks: int = 0
+
+    # whether the message is only a dad joke trigger ("I am"), and the name in
+    # a dad joke ("I am <name>"), if any
+    dad_joke_only: bool = False
+    dad_joke_name: Optional[str] = None
+
+
+# most messages have no triggers, they all share this result, because making a
+# new one takes most of the time of classifying a message
+NO_TRIGGERS = MessageTriggers()
+
+
+def origin_index(text: str, folded_ind: int):
+    """
+    Get the index of the character in text that the character at folded_ind
+    in the text folded to ASCII comes from
+    """
+    length = 0
+    for ind, char in enumerate(text):
+        length += 1 if char.isascii() else len(unidecode.unidecode(char))
+        if length > folded_ind:
+            return ind
+
+    return len(text)
+
+
+class TriggerMatcher:
+    """
+    Classifies messages, doing only the work that can change the result. Bonks
+    are counted with str.count, and dad joke triggers are only looked for in
+    messages that are short enough to be dad jokes. Non-ASCII messages are
+    folded to ASCII first, so that "I’m" triggers like "I'm"
+    """
+
+    def __init__(
+        self,
+        bonk: str,
+        dad_joke_triggers: Iterable[str] = ("i am", "i'm"),
+        dad_joke_max_len: int = 60,
+        cache_size: int = 64,
+    ):
+        self.bonk = bonk
+        # the triggers are checked in this order, only the first one that is
+        # in a message is used
+        self.dad_joke_triggers = tuple(dad_joke_triggers)
+        self.dad_joke_max_len = dad_joke_max_len
+
+        # the stages of handling a message classify it more than once
+        self.classify = functools.lru_cache(maxsize=cache_size)(self._classify)
+
+    def _classify(self, content: str):
+        """
+        Find the triggers in the content of a message
+        """
+        # the bonk emoji is ASCII, so folding does not change the count
+        bonks = content.count(self.bonk)
+        no_dad_joke = MessageTriggers(bonks) if bonks else NO_TRIGGERS
+
+        stripped = content.strip()
+        text, lead = stripped, None
+        if not stripped.isascii():
+            # folding keeps the ASCII characters, so the folded message is at
+            # least as long as them. This skips folding most long messages
+            if len(stripped.encode("ascii", "ignore").strip()) >= self.dad_joke_max_len:
+                return no_dad_joke
+
+            text = unidecode.unidecode(stripped)
+
+        if len(text) >= self.dad_joke_max_len:
+            # by far the most common case, long messages only have bonks
+            return no_dad_joke
+
+        if text is not stripped:
+            # folding can add whitespace at the ends
+            lead = len(text) - len(text.lstrip())
+            text = text.strip()
+
+        # text is ASCII now, so lowering it does not change the indices
+        lowered = text.lower()
+        for trigger in self.dad_joke_triggers:
+            if lowered == trigger:
+                return MessageTriggers(bonks, True)
+
+            ind = lowered.find(trigger)
+            if ind == -1:
+                continue
+
+            # only the first occurrence of the trigger counts, and it has to be
+            # a word of its own, that is followed by the name
+            end = ind + len(trigger)
+            if ind and not text[ind - 1].isspace():
+                break
+
+            if not text[end : end + 1].isspace():
+                break
+
+            # the name is taken from the message, not from the folded text
+            if lead is not None:
+                end = origin_index(stripped, lead + end)
+
+            name = DAD_JOKE_NAME_END.split(stripped[end:].strip(), 1)[0]
+            return MessageTriggers(bonks, False, name or None)
+
+        return no_dad_joke
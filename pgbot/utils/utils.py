@@ -21,24 +21,89 @@ import pygame
 
 from pgbot import common, db
 
+# Store the "feature" DB table, as "feature name: {channel id: disabled}" pairs,
+# where the channel IDs can also be IDs of categories
+channel_features: dict[str, dict[int, bool]] = {}
 
-async def get_channel_feature(
+# Index of channel_features, where the features set on categories are already
+# resolved onto the text channels in them. This is rebuilt lazily when channels
+# are created or moved between categories
+channel_feature_index: dict[str, dict[int, bool]] = {}
+channel_feature_index_valid = False
+
+
+async def load_channel_features():
+    """
+    Load the channel features from the DB. Call this when the bot boots up,
+    and after the "feature" DB table was overwritten
+    """
+    global channel_features
+
+    async with db.DiscordDB("feature", readonly=True) as db_obj:
+        # shallow copy, because the features of this dict get replaced
+        channel_features = dict(db_obj.snapshot({}))
+
+    invalidate_channel_features()
+
+
+def _index_channel_feature(name: str):
+    """
+    Build the index of the channels of a feature
+    """
+    features = channel_features.get(name, {})
+    index = dict(features)
+    if common.guild is not None and features:
+        for channel in common.guild.text_channels:
+            if channel.id not in features and channel.category_id in features:
+                index[channel.id] = features[channel.category_id]
+
+    channel_feature_index[name] = index
+
+
+def invalidate_channel_features():
+    """
+    Mark the channel feature index as outdated, because channels were created
+    or moved
+    """
+    global channel_feature_index_valid
+    channel_feature_index_valid = False
+
+
+def update_channel_feature(name: str, features: dict[int, bool]):
+    """
+    Update the channels of a feature, after they were changed in the DB. The
+    dict must not be modified after this
+    """
+    channel_features[name] = features
+    if channel_feature_index_valid:
+        _index_channel_feature(name)
+
+
+def get_channel_feature(
     name: str, channel: common.Channel, defaultret: bool = False
-):
+) -> bool:
     """
     Get the channel feature. Returns True if the feature name is disabled on
     that channel, False otherwise. Also handles category channel
     """
-    async with db.DiscordDB("feature") as db_obj:
-        db_dict: dict[int, bool] = db_obj.get({}).get(name, {})
+    global channel_feature_index_valid
+
+    if not channel_feature_index_valid:
+        channel_feature_index.clear()
+        for feature_name in channel_features:
+            _index_channel_feature(feature_name)
+        channel_feature_index_valid = True
+
+    index = channel_feature_index.get(name)
+    if not index:
+        return defaultret
 
-    if channel.id in db_dict:
-        return db_dict[channel.id]
+    if channel.id in index:
+        return index[channel.id]
 
-    if isinstance(channel, discord.TextChannel):
-        if channel.category_id is None:
-            return defaultret
-        return db_dict.get(channel.category_id, defaultret)
+    # channel is not in the main guild
+    if isinstance(channel, discord.TextChannel) and channel.category_id is not None:
+        return index.get(channel.category_id, defaultret)
 
     return defaultret
 